@@ -0,0 +1,157 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+
+import extract_ean
+import extract_images
+import rename_files
+from benchmark_utils import silenced_stdout
+from generate_corpus import generate_corpus, generate_workbook
+from results_store import ResultsStore, store_path_for
+
+# Les temps dépendent de la machine: la référence reste locale (.cache n'est pas versionné)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../.cache/benchmark_baseline.json')
+STEPS = ('extract', 'rename', 'images')
+# Écart absolu en dessous duquel un ralentissement est considéré comme du bruit
+MIN_DELTA_SECONDS = 0.05
+
+# Arborescence attendue par rename_files (chemins relatifs au dossier courant)
+PDF_DIRECTORY = 'A Fiches techniques a traiter'
+PROCESSED_DIRECTORY = 'B Fiches techniques traitees'
+IMAGE_DIRECTORY = 'C image extraites'
+PRODUCT_DB_NAME = 'FICHIER GENERAL.xlsx'
+
+
+def prepare_workspace(workspace, corpus_dir, workbook_path):
+    """(Re)creates workspace with the corpus in folder A and the workbook, as in the application folder."""
+    shutil.rmtree(workspace, ignore_errors=True)
+    shutil.copytree(corpus_dir, os.path.join(workspace, PDF_DIRECTORY))
+    shutil.copy(workbook_path, os.path.join(workspace, PRODUCT_DB_NAME))
+
+
+def run_steps(workspace, workers):
+    """Runs extraction, renaming and image extraction in workspace.
+    Returns ({step: seconds}, {filename: codes} extracted, files in B, images in C)."""
+    timings = {}
+    csv_path = os.path.join('.', 'ean_codes.csv')
+    previous_cwd = os.getcwd()
+    os.chdir(workspace)
+    try:
+        with silenced_stdout():
+            start = time.perf_counter()
+            extract_ean.main(PDF_DIRECTORY, csv_path, workers=workers, use_cache=False)
+            timings['extract'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rename_files.rename_pdfs()
+            timings['rename'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            extract_images.main(PROCESSED_DIRECTORY, IMAGE_DIRECTORY, workers=workers, incremental=False)
+            timings['images'] = time.perf_counter() - start
+
+        store = ResultsStore(store_path_for(csv_path))
+        try:
+            extracted = {filename: codes for filename, _, codes in store.files()}
+        finally:
+            store.close()
+        renamed = len(os.listdir(PROCESSED_DIRECTORY))
+        images = len([name for name in os.listdir(IMAGE_DIRECTORY) if not name.endswith('.json')])
+    finally:
+        os.chdir(previous_cwd)
+    return timings, extracted, renamed, images
+
+
+def compare(results, baseline, tolerance):
+    """Returns the regressions of results against baseline, and prints the comparison table."""
+    regressions = []
+    print(f"\n{'PDF':>6} {'étape':<8} {'temps':>9} {'PDF/s':>8} {'référence':>10} {'écart':>8}")
+    for size, timings in results['sizes'].items():
+        reference = (baseline or {}).get('sizes', {}).get(size, {})
+        for step in STEPS:
+            seconds = timings[step]
+            line = f"{size:>6} {step:<8} {seconds:8.2f}s {int(size) / seconds:8.1f}"
+            if step in reference:
+                change = seconds / reference[step] - 1
+                line += f" {reference[step]:9.2f}s {change:+7.0%}"
+                if change > tolerance and seconds - reference[step] > MIN_DELTA_SECONDS:
+                    line += "  REGRESSION"
+                    regressions.append(f"{step} on {size} PDF: {seconds:.2f} s against {reference[step]:.2f} s "
+                                       f"({change:+.0%}, tolerance {tolerance:.0%})")
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="End-to-end benchmark of extract_ean, rename_files and extract_images on synthetic corpora, "
+                    "compared with a stored baseline.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 800], help="corpus sizes (PDF count)")
+    parser.add_argument("--pages", type=int, default=2, help="pages per generated PDF")
+    parser.add_argument("--workers", type=int, default=1, help="workers for extraction and image encoding")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size, the fastest of each step is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown of a step above which it is reported as a regression (default: 0.25)")
+    args = parser.parse_args()
+
+    settings = {'pages': args.pages, 'workers': args.workers, 'seed': args.seed}
+    results = {'settings': settings, 'python': platform.python_version(), 'machine': platform.node(),
+               'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'sizes': {}}
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            corpus_dir = os.path.join(tmp, f"corpus_{size}")
+            workbook_path = os.path.join(tmp, f"workbook_{size}.xlsx")
+            print(f"Generating {size} PDFs of {args.pages} page(s) and the product workbook...")
+            expected = generate_corpus(corpus_dir, size, pages=args.pages, seed=args.seed, images=True)
+            generate_workbook(workbook_path, expected, seed=args.seed)
+
+            best = {}
+            for _ in range(args.repeat):
+                workspace = os.path.join(tmp, "workspace")
+                prepare_workspace(workspace, corpus_dir, workbook_path)
+                timings, extracted, renamed, images = run_steps(workspace, args.workers)
+                for step, seconds in timings.items():
+                    best[step] = min(best.get(step, seconds), seconds)
+
+            wrong = sorted(filename for filename, (codes, _) in expected.items()
+                           if extracted.get(filename) != codes)
+            if wrong:
+                failures.append(f"{size} PDF: {len(wrong)} file(s) with unexpected codes, e.g. {wrong[0]}")
+            print(f"  {len(expected) - len(wrong)}/{len(expected)} PDF with the expected codes, "
+                  f"{renamed} file(s) in B, {images} image(s) in C.")
+            results['sizes'][str(size)] = {step: round(best[step], 4) for step in STEPS}
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print(f"\nBaseline '{args.baseline}' was measured with {baseline.get('settings')}, not compared.")
+            baseline = None
+    failures += compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to '{args.baseline}'.")
+    elif baseline is None:
+        print(f"\nNo baseline to compare with: run with --save-baseline to store one in '{args.baseline}'.")
+
+    if failures:
+        print("\nRegression:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nOK: no regression.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+import os
+import time
+import argparse
+import tempfile
+
+import extract_ean
+from benchmark_utils import silenced_stdout
+from generate_corpus import generate_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extract_ean.main throughput per worker count.")
+    parser.add_argument("--pdfs", type=int, default=400, help="size of the generated corpus")
+    parser.add_argument("--pages", type=int, default=4, help="pages per generated PDF")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_dir = os.path.join(tmp, "pdfs")
+        print(f"Generating {args.pdfs} PDFs of {args.pages} page(s)...")
+        generate_corpus(pdf_dir, args.pdfs, pages=args.pages)
+
+        reference = None
+        for workers in args.workers:
+            csv_path = os.path.join(tmp, f"ean_codes_{workers}.csv")
+            start = time.perf_counter()
+            with silenced_stdout():
+                extract_ean.main(pdf_dir, csv_path, workers=workers, use_cache=False)
+            elapsed = time.perf_counter() - start
+
+            with open(csv_path, encoding='utf-8') as f:
+                content = f.read()
+            if reference is None:
+                reference = content
+            same = "identical" if content == reference else "DIFFERENT"
+            print(f"workers={workers:<3} {elapsed:7.2f} s  {args.pdfs / elapsed:8.1f} PDF/s  (csv {same})")
+
+
+if __name__ == "__main__":
+    main()
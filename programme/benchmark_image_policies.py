@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import extract_images
+from benchmark_utils import silenced_stdout
+from generate_corpus import generate_corpus
+
+POLICIES = [
+    ("png (level 6)", {'format': 'png'}),
+    ("png (level 1)", {'format': 'png', 'png_compress_level': 1}),
+    ("native", {'format': 'native'}),
+    ("webp (q80)", {'format': 'webp'}),
+    ("png max 256", {'format': 'png', 'max_dim': 256}),
+    ("native max 256", {'format': 'native', 'max_dim': 256}),
+]
+
+
+def output_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+               if name != extract_images.MANIFEST_NAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the image output policies of extract_images.")
+    parser.add_argument("--count", type=int, default=40, help="PDFs in the generated corpus")
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--photo-size", type=int, default=1024, help="side of the product photo (pixels)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_images_")
+    try:
+        pdf_dir = os.path.join(work_dir, "B")
+        generate_corpus(pdf_dir, args.count, pages=args.pages, seed=args.seed, images=True, prefix="R",
+                        photo_size=args.photo_size)
+        print(f"{args.count} PDF, {args.pages} page(s), photo {args.photo_size}px, {args.workers} worker(s)\n")
+        print(f"{'policy':<16} {'time':>8} {'output':>10} {'images':>7}")
+
+        for i, (name, policy) in enumerate(POLICIES):
+            out_dir = os.path.join(work_dir, f"C_{i}")
+            start = time.perf_counter()
+            with silenced_stdout():
+                extract_images.main(pdf_dir, out_dir, workers=args.workers, policy=policy)
+            elapsed = time.perf_counter() - start
+            images = len(os.listdir(out_dir)) - 1
+            print(f"{name:<16} {elapsed:7.2f}s {output_size(out_dir) / 1024:8.0f} Ko {images:7d}")
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import argparse
+import subprocess
+
+# Modules lancés par le menu / la ligne de commande
+ENTRY_MODULES = ['cli', 'extract_ean', 'rename_files', 'extract_images', 'pipeline', 'watch', 'product_index',
+                 'view_pdf_structure']
+# Bibliothèques qui ne doivent être chargées que par les fonctions qui s'en servent
+HEAVY_MODULES = ('fitz', 'pymupdf', 'pandas', 'numpy', 'PIL', 'openpyxl')
+
+
+def import_times(module):
+    """Runs `python -X importtime -c "import module"` in a fresh interpreter and
+    returns {imported module: cumulative microseconds}."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import-time report of the entry modules; fails if a heavy library is imported at start-up.")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per module, the fastest is kept")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="also fail if importing an entry module takes longer than this")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports listed per module")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<16} {'import':>9}  slowest dependencies")
+    for module in ENTRY_MODULES:
+        runs = [import_times(module) for _ in range(args.repeat)]
+        times = min(runs, key=lambda t: t[module])
+        total_ms = times[module] / 1000
+        heavy = sorted({name.split('.')[0] for name in times} & set(HEAVY_MODULES))
+        slowest = sorted(((t, name) for name, t in times.items() if name != module and '.' not in name),
+                         reverse=True)[:args.top]
+        print(f"{module:<16} {total_ms:7.1f}ms  " + ", ".join(f"{name} {t / 1000:.1f}ms" for t, name in slowest))
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at start-up")
+        if args.max_ms is not None and total_ms > args.max_ms:
+            failures.append(f"{module} takes {total_ms:.1f} ms to import (max {args.max_ms} ms)")
+
+    if failures:
+        print("\nRegression:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nOK: no heavy library imported at start-up.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import re
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from product_index import build_lookup_maps
+
+
+def legacy_build_lookup_maps(db_df):
+    """Map construction of rename_pdfs before vectorization (iterrows for LMA), kept for comparison."""
+    product_name_col, ean_col, ref_fourn_col, brand_col = db_df.columns[3:7]
+
+    ean_map_df = db_df.dropna(subset=[product_name_col, ean_col])
+    ean_to_name_map = pd.Series(ean_map_df[product_name_col].values, index=ean_map_df[ean_col]).to_dict()
+
+    autobest_df = db_df[db_df[brand_col] == 'AUTOBEST'].dropna(subset=[product_name_col, ref_fourn_col])
+    autobest_to_name_map = pd.Series(autobest_df[product_name_col].values, index=autobest_df[ref_fourn_col]).to_dict()
+
+    lma_df = db_df[db_df[brand_col] == 'LMA'].dropna(subset=[product_name_col, ref_fourn_col])
+    lma_code_to_refs = {}
+    for _, row in lma_df.iterrows():
+        ref_fourn = str(row[ref_fourn_col])
+        product_name = row[product_name_col]
+        base_code = re.split(r'[-\s]', ref_fourn)[0]
+        if base_code.isdigit() and len(base_code) >= 4:
+            if base_code not in lma_code_to_refs:
+                lma_code_to_refs[base_code] = []
+            lma_code_to_refs[base_code].append({'product_name': product_name, 'ref_fourn': ref_fourn})
+
+    return ean_to_name_map, autobest_to_name_map, lma_code_to_refs
+
+
+def synthetic_product_table(rows, seed=0):
+    """Product table shaped like FICHIER GENERAL.xlsx read with dtype=str (columns A to G)."""
+    rng = np.random.default_rng(seed)
+    brands = rng.choice(['ARTUB', 'AUTOBEST', 'LMA', 'AUTRE'], size=rows, p=[0.5, 0.15, 0.3, 0.05])
+    names = np.char.add('R', np.arange(rows).astype(str))
+    eans = rng.integers(10**12, 10**13, size=rows).astype(str).astype(object)
+    eans[rng.random(rows) < 0.3] = None
+    base = rng.integers(1000, 20000, size=rows).astype(str)
+    sizes = rng.choice(['-S', '-M', ' XL', '-42', '', '/A'], size=rows)
+    refs = np.char.add(base, sizes).astype(object)
+    refs[rng.random(rows) < 0.05] = None
+    names = names.astype(object)
+    names[rng.random(rows) < 0.02] = None
+    empty = np.full(rows, None, dtype=object)
+    return pd.DataFrame({'A': empty, 'B': empty, 'C': empty, 'Designation': names,
+                         'EAN': eans, 'Ref Four': refs, 'Marque': brands.astype(object)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare vectorized and iterrows construction of the lookup maps.")
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    db_df = synthetic_product_table(args.rows)
+    timings = {}
+    results = {}
+    for name, function in (("legacy", legacy_build_lookup_maps), ("vectorized", build_lookup_maps)):
+        start = time.perf_counter()
+        results[name] = function(db_df)
+        timings[name] = time.perf_counter() - start
+
+    same = results["legacy"] == results["vectorized"]
+    ean_map, autobest_map, lma_map = results["vectorized"]
+    print(f"{args.rows} rows: {len(ean_map)} EAN, {len(autobest_map)} AUTOBEST, {len(lma_map)} LMA base codes")
+    print(f"legacy     {timings['legacy']:7.2f} s")
+    print(f"vectorized {timings['vectorized']:7.2f} s  (x{timings['legacy'] / timings['vectorized']:.1f}, "
+          f"maps {'identical' if same else 'DIFFERENT'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+import re
+import time
+import argparse
+import tempfile
+import contextlib
+import io
+import fitz  # PyMuPDF
+
+import extract_ean
+from generate_corpus import generate_corpus
+
+
+def legacy_scan(page_texts):
+    """The per-page logic of extract_ean_from_pdf before SUPPLIER_RULES, kept for comparison."""
+    ean_codes = []
+    contains_lma = False
+    contains_autobest = False
+    lma_product_code = None
+    autobest_code = None
+    full_text = ""
+    fournisseur = ""
+
+    for text in page_texts:
+        full_text += text
+        found_codes = re.findall(r'\b\d{13}\b', text)
+        if found_codes:
+            ean_codes.extend(found_codes)
+        if "www.lma-lebeurre.com" in text:
+            contains_lma = True
+        if "AUTOBEST" in text:
+            contains_autobest = True
+
+    if contains_lma:
+        match = re.search(r'WORKWEAR\s+1880\s+(\d{4,})', full_text)
+        if match:
+            lma_product_code = match.group(1)
+
+    if contains_autobest:
+        if full_text.find("AUTOBEST - BP 67") != -1:
+            match = re.search(r'\s*(\d+)\s*AUTOBEST - BP 67', full_text)
+            if match:
+                autobest_code = match.group(1).strip()
+
+    unique_codes = list(set(ean_codes))
+    if not unique_codes and contains_lma:
+        if lma_product_code:
+            unique_codes = [lma_product_code]
+        fournisseur = "LMA"
+    if contains_autobest and autobest_code:
+        unique_codes = [autobest_code]
+        fournisseur = "AUTOBEST"
+    return unique_codes, fournisseur
+
+
+def rules_scan(page_texts):
+    scan = extract_ean.SupplierScan()
+    for text in page_texts:
+        scan.feed(text)
+    return scan.resolve()
+
+
+def legacy_extract_ean_from_pdf(pdf_path):
+    doc = fitz.open(pdf_path)
+    texts = [doc.load_page(page_num).get_text() for page_num in range(len(doc))]
+    doc.close()
+    return legacy_scan(texts)
+
+
+def timed(function, items):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [function(item) for item in items]
+    return time.perf_counter() - start, results
+
+
+def same_results(a, b):
+    return all(set(codes_a) == set(codes_b) and f_a == f_b for (codes_a, f_a), (codes_b, f_b) in zip(a, b))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare SUPPLIER_RULES single-pass scanning with the legacy extraction.")
+    parser.add_argument("--pdfs", type=int, default=30)
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=5, help="text-only scan repetitions")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"Generating {args.pdfs} PDFs of {args.pages} pages...")
+        generate_corpus(tmp, args.pdfs, pages=args.pages)
+        paths = sorted(os.path.join(tmp, f) for f in os.listdir(tmp))
+
+        # Fonction complète (ouverture + décodage du texte + règles)
+        legacy_time, legacy_results = timed(legacy_extract_ean_from_pdf, paths)
+        new_time, new_results = timed(extract_ean.extract_ean_from_pdf, paths)
+        print(f"extract_ean_from_pdf  legacy {legacy_time:7.3f} s   rules {new_time:7.3f} s   "
+              f"(results {'identical' if same_results(legacy_results, new_results) else 'DIFFERENT'})")
+
+        # Règles seules, sur le texte déjà décodé
+        texts = []
+        for path in paths:
+            with fitz.open(path) as doc:
+                texts.append([page.get_text() for page in doc])
+        texts = texts * args.repeat
+        legacy_time, legacy_results = timed(legacy_scan, texts)
+        new_time, new_results = timed(rules_scan, texts)
+        megabytes = sum(len(t) for pages in texts for t in pages) / 1e6
+        print(f"text scan only        legacy {legacy_time:7.3f} s   rules {new_time:7.3f} s   "
+              f"({megabytes:.1f} MB of text, {megabytes / new_time:.1f} MB/s, "
+              f"results {'identical' if same_results(legacy_results, new_results) else 'DIFFERENT'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import os
+import sys
+import contextlib
+
+
+@contextlib.contextmanager
+def silenced_stdout():
+    """Redirects fd 1 to devnull, so prints of pool workers are silenced too."""
+    sys.stdout.flush()
+    saved_fd = os.dup(1)
+    with open(os.devnull, 'w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved_fd, 1)
+            os.close(saved_fd)
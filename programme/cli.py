@@ -0,0 +1,38 @@
+import sys
+import argparse
+import importlib
+
+# Sous-commande -> (module, résumé). Seul le module de la commande lancée est importé.
+COMMANDS = {
+    'extract': ('extract_ean', "codes EAN / fournisseur des PDF du dossier A -> ean_codes.csv"),
+    'rename': ('rename_files', "renommage des PDF du dossier A vers le dossier B"),
+    'images': ('extract_images', "images des PDF R* du dossier B -> dossier C"),
+    'pipeline': ('pipeline', "extraction, renommage et images en un seul passage"),
+    'watch': ('watch', "surveillance du dossier A"),
+    'index': ('product_index', "compilation de l'index produits du FICHIER GENERAL.xlsx"),
+    'inspect': ('view_pdf_structure', "structure d'un PDF, ou résumé JSON de chaque PDF d'un dossier"),
+}
+
+
+def usage():
+    lines = ["usage: python programme/cli.py <commande> [options]", "", "commandes:"]
+    lines += [f"  {name:<10}{summary}" for name, (_, summary) in COMMANDS.items()]
+    lines += ["", "python programme/cli.py <commande> --help pour les options d'une commande."]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in COMMANDS:
+        print(usage())
+        return 0 if argv and argv[0] in ('-h', '--help') else 2
+    name, args = argv[0], argv[1:]
+    module = importlib.import_module(COMMANDS[name][0])
+    parser = argparse.ArgumentParser(prog=f"cli.py {name}", description=module.DESCRIPTION)
+    module.add_arguments(parser)
+    module.run(parser.parse_args(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
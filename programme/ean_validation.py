@@ -0,0 +1,39 @@
+def valid_gtin(codes, length=13):
+    """Vectorized GTIN check-digit validation (EAN-13 by default, also GTIN-8/12/14).
+
+    codes is any sequence of strings. Returns a boolean numpy array, True
+    where the code has exactly `length` ASCII digits and a valid check digit."""
+    import numpy as np
+    codes = list(codes)
+    lengths = np.fromiter(map(len, codes), dtype=np.int64, count=len(codes))
+    # Chaque caractère UCS-4 devient un entier; les codes trop courts sont complétés par des zéros
+    # (et les trop longs tronqués, mais rejetés par le test de longueur)
+    chars = np.array(codes, dtype=f'U{length}')
+    digits = chars.view(np.uint32).reshape(-1, length).astype(np.int64) - ord('0')
+    all_digits = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    # Poids 3,1,3,1... en partant du chiffre à gauche de la clé de contrôle
+    weights = np.where(np.arange(length - 1)[::-1] % 2 == 0, 3, 1)
+    check = (10 - (digits[:, :-1] @ weights) % 10) % 10
+    return (lengths == length) & all_digits & (check == digits[:, -1])
+
+
+def valid_ean13(codes):
+    """Returns a boolean numpy array, True for each valid EAN-13 code."""
+    return valid_gtin(codes, 13)
+
+
+def invalid_ean13_per_row(code_lists):
+    """Validates a whole column of code lists in one vectorized call.
+
+    Returns, for each input list, the list of its codes that are not valid EAN-13."""
+    import numpy as np
+    code_lists = [list(codes) for codes in code_lists]
+    flat = [code for codes in code_lists for code in codes]
+    if not flat:
+        return [[] for _ in code_lists]
+    invalid = np.flatnonzero(~valid_ean13(flat))
+    rows = np.searchsorted(np.cumsum([len(codes) for codes in code_lists]), invalid, side='right')
+    result = [[] for _ in code_lists]
+    for index, row in zip(invalid.tolist(), rows.tolist()):
+        result[row].append(flat[index])
+    return result
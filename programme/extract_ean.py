@@ -1,92 +1,315 @@
 import os
 import re
-import fitz  # PyMuPDF
-import csv
+import argparse
+from extraction_cache import ExtractionCache
+from results_store import ResultsStore, store_path_for
+from ean_validation import valid_ean13
+import metrics
+from metrics import FileMetrics
 
-def extract_ean_from_pdf(pdf_path):
+# A incrémenter à chaque modification des règles d'extraction (invalide le cache)
+EXTRACTION_RULES_VERSION = "3"
+CACHE_PATH = os.path.join(os.path.dirname(__file__), '../.cache/ean_cache.json')
+
+# Règles fournisseurs, appliquées page par page.
+#   marker       : texte dont la présence identifie le fournisseur
+#   code_pattern : regex du contexte du code produit, {code} marquant la place
+#                  du code (suite de chiffres d'au moins code_digits chiffres)
+#   literal      : texte toujours présent dans ce contexte; la regex n'est
+#                  lancée que sur les pages qui le contiennent
+#   mode         : "override" -> le code remplace les EAN trouvés
+#                  "fallback" -> le fournisseur n'est retenu que sans EAN
+#   priority     : la règle de plus haute priorité l'emporte
+SUPPLIER_RULES = [
+    {
+        'fournisseur': 'AUTOBEST',
+        'marker': 'AUTOBEST',
+        'code_pattern': r'{code}\s*AUTOBEST - BP 67',
+        'literal': 'AUTOBEST - BP 67',
+        'code_digits': 1,
+        'mode': 'override',
+        'priority': 20,
+    },
+    {
+        'fournisseur': 'LMA',
+        'marker': 'www.lma-lebeurre.com',
+        'code_pattern': r'WORKWEAR\s+1880\s+{code}',
+        'literal': 'WORKWEAR',
+        'code_digits': 4,
+        'mode': 'fallback',
+        'priority': 10,
+    },
+]
+
+EAN_LENGTH = 13
+# reject: les candidats à 13 chiffres dont la clé EAN est fausse sont écartés
+# flag: ils sont gardés et listés dans la colonne "Invalid EAN Codes"
+EAN_CHECKS = ('reject', 'flag', 'off')
+
+
+def _compile_contexts(rules):
+    """One regex per rule for the whole code context, the code being the first group."""
+    return [re.compile(rule['code_pattern'].replace('{code}', r'(?<!\d)(\d+)')) for rule in rules]
+
+
+# Candidats EAN: suites de 13 chiffres isolées
+_EAN_PATTERN = re.compile(rf'\b\d{{{EAN_LENGTH}}}\b')
+_CONTEXT_PATTERNS = _compile_contexts(SUPPLIER_RULES)
+_RULES_BY_PRIORITY = sorted(range(len(SUPPLIER_RULES)), key=lambda i: -SUPPLIER_RULES[i]['priority'])
+# Caractères de fin et de début de page gardés pour les contextes coupés par un saut de page
+PAGE_EDGE_CHARS = 256
+
+
+class SupplierScan:
+    """Accumulates EAN candidates, supplier markers and supplier codes page by page."""
+
+    def __init__(self, ean_check='reject'):
+        self.ean_check = ean_check
+        self.ean_codes = {}   # candidat -> page (dict utilisé comme ensemble ordonné)
+        self.markers = set()  # index des règles dont le marqueur a été vu
+        self.codes = {}       # index de règle -> premier code trouvé
+        self.code_pages = {}  # index de règle -> page de ce code
+        self.page = None      # page (1-based) du texte en cours
+        self._edges = {}      # page -> (début, fin, page courte) de son texte, pour les sauts de page
+
+    def _add_code(self, rule_index, code, page):
+        if rule_index not in self.codes and len(code) >= SUPPLIER_RULES[rule_index]['code_digits']:
+            self.codes[rule_index] = code
+            self.code_pages[rule_index] = page
+
+    def feed(self, text, page=None):
+        """Scans the text of one page. Pages are numbered from 1; without
+        page numbers, successive calls are taken as successive pages.
+
+        The EAN candidates are found with one regex; the markers and the
+        literal part of each code context are looked up with substring
+        searches, so a rule regex only runs on the pages that can match it."""
+        if page is None:
+            page = len(self._edges) + 1
+        self.page = page
+        for code in _EAN_PATTERN.findall(text):
+            self.ean_codes.setdefault(code, page)
+        for rule_index, rule in enumerate(SUPPLIER_RULES):
+            if rule['marker'] in text:
+                self.markers.add(rule_index)
+
+        # Contextes coupés par un saut de page (le texte complet était lu d'un bloc):
+        # la fin des pages précédentes est examinée avant cette page
+        self._edges[page] = (text[:PAGE_EDGE_CHARS], text[-PAGE_EDGE_CHARS:], len(text) < PAGE_EDGE_CHARS)
+        if page - 1 in self._edges:
+            self._scan_page_break(page)
+        self._scan_contexts(text, page)
+        if page + 1 in self._edges:
+            self._scan_page_break(page + 1)
+
+    def _scan_contexts(self, text, page):
+        """Adds the supplier codes found in the text of one page."""
+        for rule_index, rule in enumerate(SUPPLIER_RULES):
+            if rule_index in self.codes or rule['literal'] not in text:
+                continue
+            for match in _CONTEXT_PATTERNS[rule_index].finditer(text):
+                self._add_code(rule_index, match.group(1), page)
+                if rule_index in self.codes:
+                    break
+
+    def _scan_page_break(self, page):
+        """Adds the supplier codes whose context spans the break before page.
+
+        The end of the previous pages and the start of the next ones already
+        scanned are joined (several pages if they are shorter than
+        PAGE_EDGE_CHARS), and only the matches crossing the break are taken."""
+        before = []  # (page, texte) dans l'ordre
+        q = page - 1
+        while q in self._edges:
+            _, tail, short = self._edges[q]
+            before.insert(0, (q, tail))
+            if not short or sum(len(t) for _, t in before) >= PAGE_EDGE_CHARS:
+                break
+            q -= 1
+        after = []
+        q = page
+        while q in self._edges:
+            head, _, short = self._edges[q]
+            after.append(head)
+            if not short or sum(len(t) for t in after) >= PAGE_EDGE_CHARS:
+                break
+            q += 1
+        text = ''.join(t for _, t in before)
+        boundary = len(text)
+        text += ''.join(after)
+
+        for rule_index, rule in enumerate(SUPPLIER_RULES):
+            if rule_index in self.codes or rule['literal'] not in text:
+                continue
+            for match in _CONTEXT_PATTERNS[rule_index].finditer(text):
+                if match.start() < boundary < match.end():
+                    # Page où commence le code
+                    code_page, offset = page, boundary
+                    for q, tail in reversed(before):
+                        offset -= len(tail)
+                        if match.start(1) >= offset:
+                            code_page = q
+                            break
+                    self._add_code(rule_index, match.group(1), code_page)
+                    if rule_index in self.codes:
+                        break
+
+    def valid_ean_codes(self):
+        """EAN candidates, without those failing the check digit when ean_check is 'reject'."""
+        codes = list(self.ean_codes)
+        if self.ean_check != 'reject' or not codes:
+            return codes
+        return [code for code, valid in zip(codes, valid_ean13(codes)) if valid]
+
+    def is_conclusive(self):
+        """True when pages not yet decoded can no longer change the result."""
+        for i in _RULES_BY_PRIORITY:
+            if SUPPLIER_RULES[i]['mode'] == 'override' and i in self.markers:
+                # Code prioritaire trouvé, ou attendu sur une autre page
+                return i in self.codes
+        if self.valid_ean_codes():
+            return True
+        return any(SUPPLIER_RULES[i]['mode'] == 'fallback' and i in self.codes
+                   for i in self.markers)
+
+    def pages(self, codes):
+        """Returns {code: page where it was first seen} for codes returned by resolve()."""
+        found = dict(self.ean_codes)
+        for rule_index, code in self.codes.items():
+            found.setdefault(code, self.code_pages[rule_index])
+        return {code: found.get(code) for code in codes}
+
+    def resolve(self):
+        """Applies the supplier rules and returns (codes, fournisseur)."""
+        for i in _RULES_BY_PRIORITY:
+            rule = SUPPLIER_RULES[i]
+            if rule['mode'] == 'override' and i in self.markers and i in self.codes:
+                print(f"Code {rule['fournisseur']} trouvé dans le contenu: {self.codes[i]}")
+                return [self.codes[i]], rule['fournisseur']
+
+        ean_codes = self.valid_ean_codes()
+        if len(ean_codes) < len(self.ean_codes):
+            kept = set(ean_codes)
+            rejected = [code for code in self.ean_codes if code not in kept]
+            print(f"Rejected {len(rejected)} candidate(s) with an invalid EAN check digit: {';'.join(rejected)}")
+        if ean_codes:
+            return ean_codes, ""
+
+        for i in _RULES_BY_PRIORITY:
+            rule = SUPPLIER_RULES[i]
+            if rule['mode'] == 'fallback' and i in self.markers:
+                if i in self.codes:
+                    print(f"Code {rule['fournisseur']} trouvé: {self.codes[i]}")
+                    return [self.codes[i]], rule['fournisseur']
+                return [], rule['fournisseur']
+
+        return [], ""
+
+
+SCAN_STRATEGIES = ('full', 'edges')
+
+
+def _page_order(page_count, scan):
+    if scan == 'edges' and page_count > 2:
+        # Tableau EAN et pied de page fournisseur: première et dernière page d'abord
+        return [0, page_count - 1] + list(range(1, page_count - 1)), 2
+    return list(range(page_count)), page_count
+
+
+def extract_ean_from_pdf(pdf_path, scan='full', stats=None, ean_check='reject', file_metrics=None):
     """Extracts all 13-digit numbers (EAN codes) from a PDF file.
-    Also checks for specific text "www.lma-lebeurre.com" if no EAN codes found.
-    For LMA files, extracts the product code after "WORKWEAR 1880".
-    For AUTOBEST files, extracts the reference at the beginning of the text before "AUTOBEST"."""
-    ean_codes = []
-    contains_lma = False
-    contains_autobest = False
-    lma_product_code = None
-    autobest_code = None
-    full_text = ""
-    fournisseur = ""
-    
+    Supplier-specific codes are resolved with SUPPLIER_RULES: for LMA files
+    (www.lma-lebeurre.com, no EAN) the product code after "WORKWEAR 1880",
+    for AUTOBEST files the reference before "AUTOBEST - BP 67".
+
+    With scan='edges' the first and last pages are decoded first and the
+    other pages only if those are not conclusive. If a dict is passed as
+    stats, 'pages_decoded', 'pages_total', 'code_pages' ({code: page}) and
+    'error' (the message if the PDF could not be read, else None) are set
+    in it. With
+    ean_check='reject', 13-digit candidates with a wrong check digit
+    (phone, lot or SIRET numbers) are discarded. Stage timings (open,
+    decode, regex) and counters are added to file_metrics if given."""
+    import fitz  # PyMuPDF
+    if file_metrics is None:
+        file_metrics = FileMetrics('extract', os.path.basename(pdf_path))
+    supplier_scan = SupplierScan(ean_check)
+    pages_decoded = 0
+    page_count = 0
+    error = None
+
     try:
-        doc = fitz.open(pdf_path)
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            full_text += text
-            
-            # Regex to find all 13-digit numbers
-            found_codes = re.findall(r'\b\d{13}\b', text)
-            if found_codes:
-                ean_codes.extend(found_codes)
-            
-            # Vérifier si le texte contient www.lma-lebeurre.com
-            if "www.lma-lebeurre.com" in text:
-                contains_lma = True
-                
-            # Vérifier si le texte contient AUTOBEST
-            if "AUTOBEST" in text:
-                contains_autobest = True
-                       
-        # Si c'est un fichier LMA, chercher le code produit après "WORKWEAR 1880"
-        if contains_lma:
-            # Rechercher le motif "WORKWEAR 1880" suivi d'un nombre à 4+ chiffres
-            match = re.search(r'WORKWEAR\s+1880\s+(\d{4,})', full_text)
-            if match:
-                lma_product_code = match.group(1)
-                print(f"Code LMA trouvé: {lma_product_code}")
-        
-        # Si c'est un fichier AUTOBEST, extraire la référence après "Aperçu du texte:"
-        if contains_autobest:
-                       # Rechercher le motif "Aperçu du texte:" suivi de chiffres
-            # Afficher le texte autour de "Aperçu du texte:" pour débogage
-            apercu_index = full_text.find("AUTOBEST - BP 67")
-            if apercu_index != -1:
-                debug_text = full_text[apercu_index:apercu_index+100]
-               
-                # Extraire les chiffres après "AUTOBEST - BP 67"
-                match = re.search(r'\s*(\d+)\s*AUTOBEST - BP 67', full_text)
-                if match:
-                    autobest_code = match.group(1).strip()
-                    print(f"Code AUTOBEST trouvé dans le contenu: {autobest_code}")
-                else:
-                    print("Motif 'Code AUTOBEST' non trouvé")
-        
+        with file_metrics.stage('open'):
+            doc = fitz.open(pdf_path)
+            page_count = len(doc)
+        order, budget = _page_order(page_count, scan)
+        for position, page_num in enumerate(order):
+            if position == budget and supplier_scan.is_conclusive():
+                break
+            with file_metrics.stage('decode'):
+                text = doc.load_page(page_num).get_text()
+            with file_metrics.stage('regex'):
+                supplier_scan.feed(text, page_num + 1)
+            pages_decoded += 1
         doc.close()
     except Exception as e:
         print(f"Error processing file {os.path.basename(pdf_path)}: {e}")
-    
-    # Return unique EAN codes
-    unique_codes = list(set(ean_codes))
-    
-    # Si aucun code EAN trouvé et c'est un fichier LMA, utiliser le code produit LMA s'il existe
-    if not unique_codes and contains_lma:
-        if lma_product_code:
-            # Ajouter le code produit LMA comme "code EAN"
-            unique_codes = [lma_product_code]
-            fournisseur = "LMA"
-        else:
-            fournisseur = "LMA"
-    
-    # Si c'est un fichier AUTOBEST, utiliser le code AUTOBEST extrait du contenu
-    if contains_autobest and autobest_code:
-        unique_codes = [autobest_code]
-        fournisseur = "AUTOBEST"
-    
-    return unique_codes, fournisseur
-
-def main():
-    """Main function to process all PDFs in a directory and write to a CSV."""
-    pdf_directory = os.path.join(os.path.dirname(__file__), '../A Fiches techniques a traiter')
-    output_csv_path = os.path.join(os.path.dirname(__file__), '../ean_codes.csv')
+        error = str(e)
+
+    if stats is not None:
+        stats['pages_decoded'] = pages_decoded
+        stats['pages_total'] = page_count
+        stats['error'] = error
+    with file_metrics.stage('regex'):
+        codes, fournisseur = supplier_scan.resolve()
+    if stats is not None:
+        stats['code_pages'] = supplier_scan.pages(codes)
+    file_metrics.count('pages', pages_decoded)
+    file_metrics.count('pages_total', page_count)
+    file_metrics.count('codes', len(codes))
+    return codes, fournisseur
+
+def _analyze_pdf(pdf_path, scan='full', ean_check='reject'):
+    """Process pool worker: each call opens its own fitz document.
+    Returns (filename, codes, fournisseur, stats, file metrics)."""
+    stats = {}
+    file_metrics = FileMetrics('extract', os.path.basename(pdf_path))
+    ean_codes, fournisseur = extract_ean_from_pdf(pdf_path, scan=scan, stats=stats, ean_check=ean_check,
+                                                  file_metrics=file_metrics)
+    return os.path.basename(pdf_path), ean_codes, fournisseur, stats, file_metrics.finish()
+
+def _print_result(filename, ean_codes, stats=None):
+    print(f"--- Analyzing PDF content of: {filename} ---")
+    if ean_codes:
+        print(f"Found codes: {';'.join(ean_codes)}")
+    else:
+        print("No codes found.")
+    if stats:
+        print(f"Pages decoded: {stats['pages_decoded']}/{stats['pages_total']}")
+    print("-" * (len(filename) + 20) + "\n")
+
+def main(pdf_directory=None, output_csv_path=None, workers=1, use_cache=True, cache_size=10000, scan='full',
+         ean_check='reject', metrics_path=None, store_path=None):
+    """Main function to process all PDFs in a directory and write to a CSV.
+
+    With workers > 1 the PDFs are analysed in a process pool; results are
+    printed as they complete but the CSV is always written in filename order.
+    Unless use_cache is False, PDFs whose content was already analysed with
+    the current EXTRACTION_RULES_VERSION are taken from the on-disk cache.
+    scan and ean_check are passed to extract_ean_from_pdf; with
+    ean_check='flag' the codes failing the EAN-13 check digit are listed in
+    the 'Invalid EAN Codes' column. With metrics_path, per-PDF stage
+    timings and counters are written there (see metrics.py).
+
+    The results, with the page of each code, are saved in the SQLite store
+    (results_store.py, next to the CSV by default) read by rename_files;
+    the CSV is exported from it for the manual corrections."""
+    if pdf_directory is None:
+        pdf_directory = os.path.join(os.path.dirname(__file__), '../A Fiches techniques a traiter')
+    if output_csv_path is None:
+        output_csv_path = os.path.join(os.path.dirname(__file__), '../ean_codes.csv')
+    if store_path is None:
+        store_path = store_path_for(output_csv_path)
 
     if not os.path.isdir(pdf_directory):
         print(f"Error: Directory not found at '{pdf_directory}'")
@@ -94,29 +317,111 @@ def main():
 
     print(f"Searching for PDF files in: {pdf_directory}\n")
 
-    with open(output_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile, delimiter=';')
-        csv_writer.writerow(['Filename', 'EAN Codes', 'Fournisseur'])
+    filenames = sorted(f for f in os.listdir(pdf_directory) if f.lower().endswith('.pdf'))
+    results = {}
+    code_pages = {}
+    pages_decoded = 0
+    pages_total = 0
+    # La stratégie de lecture peut changer le résultat: elle fait partie de la version
+    rules_version = f"{EXTRACTION_RULES_VERSION}-{scan}-{ean_check}"
+    cache = ExtractionCache(CACHE_PATH, rules_version, max_entries=cache_size) if use_cache else None
+    cache_keys = {}
+    metrics_writer = metrics.MetricsWriter(metrics_path) if metrics_path else None
+
+    # Les PDF déjà analysés (même contenu) ne sont pas rouverts
+    to_analyze = []
+    for filename in filenames:
+        if cache is not None:
+            try:
+                key = cache.content_key(os.path.join(pdf_directory, filename))
+            except OSError as e:
+                # Illisible ou verrouillé: analysé sans cache, l'erreur est signalée par l'analyse
+                print(f"Cache skipped for '{filename}': {e}")
+                to_analyze.append(filename)
+                continue
+            cached = cache.get(key)
+            if cached is not None:
+                results[filename] = cached
+                code_pages[filename] = cache.pages(key)
+                _print_result(filename, cached[0])
+                if metrics_writer is not None:
+                    file_metrics = FileMetrics('extract', filename)
+                    file_metrics.count('cache_hits')
+                    file_metrics.count('codes', len(cached[0]))
+                    metrics_writer.write(file_metrics)
+                continue
+            cache_keys[filename] = key
+        to_analyze.append(filename)
+
+    def collect(filename, ean_codes, fournisseur, stats, file_metrics):
+        nonlocal pages_decoded, pages_total
+        results[filename] = (ean_codes, fournisseur)
+        code_pages[filename] = stats['code_pages']
+        pages_decoded += stats['pages_decoded']
+        pages_total += stats['pages_total']
+        if filename in cache_keys:
+            # Un échec de lecture (peut-être temporaire) n'est pas mis en cache
+            if not stats['error']:
+                cache.put(cache_keys[filename], ean_codes, fournisseur, stats['code_pages'])
+            file_metrics.count('cache_misses')
+        if metrics_writer is not None:
+            metrics_writer.write(file_metrics)
+        _print_result(filename, ean_codes, stats)
+
+    if workers > 1 and len(to_analyze) > 1:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_analyze_pdf, os.path.join(pdf_directory, filename), scan, ean_check)
+                       for filename in to_analyze]
+            for future in as_completed(futures):
+                collect(*future.result())
+    else:
+        for filename in to_analyze:
+            # Analyser le contenu du PDF pour tous les fichiers
+            collect(*_analyze_pdf(os.path.join(pdf_directory, filename), scan, ean_check))
+
+    store = ResultsStore(store_path)
+    try:
+        store.put_results(results, code_pages)
+        store.retain(filenames)
+        store.export_csv(output_csv_path, ean_check)
+        print(f"\nProcessing complete. Results saved to '{store_path}' ({store.summary()}) "
+              f"and exported to '{output_csv_path}'")
+    finally:
+        store.close()
+    print(f"Pages decoded: {pages_decoded}/{pages_total} (scan '{scan}').")
+    if cache is not None:
+        cache.save()
+        print(f"Cache: {cache.hits} hit(s), {cache.misses} miss(es).")
+    if metrics_writer is not None:
+        metrics_writer.close()
+        print(metrics_writer.summary())
+
+
+DESCRIPTION = "Extract EAN / supplier codes from the PDFs of folder A."
+
 
-        for filename in os.listdir(pdf_directory):
-            if filename.lower().endswith('.pdf'):
-                ean_codes = []
-                # Analyser le contenu du PDF pour tous les fichiers
-                print(f"--- Analyzing PDF content of: {filename} ---")
-                pdf_path = os.path.join(pdf_directory, filename)
-                ean_codes, fournisseur = extract_ean_from_pdf(pdf_path)
-                
-                ean_codes_str = ';'.join(ean_codes)
-                csv_writer.writerow([filename, ean_codes_str, fournisseur])
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (default: 1, serial)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-analyse every PDF instead of reusing cached results")
+    parser.add_argument("--cache-size", type=int, default=10000,
+                        help="maximum number of cached PDF results (default: 10000)")
+    parser.add_argument("--scan", choices=SCAN_STRATEGIES, default="full",
+                        help="'edges' decodes the first and last pages first and the others only if needed")
+    parser.add_argument("--ean-check", choices=EAN_CHECKS, default="reject",
+                        help="what to do with 13-digit candidates failing the EAN check digit (default: reject)")
+    metrics.add_arguments(parser)
 
-                if ean_codes:
-                    print(f"Found codes: {ean_codes_str}")
-                else:
-                    print("No codes found.")
-                print("-" * (len(filename) + 20) + "\n")
 
-    print(f"\nProcessing complete. Results saved to '{output_csv_path}'")
+def run(args):
+    with metrics.profiled(args.profile):
+        main(workers=args.workers, use_cache=not args.no_cache, cache_size=args.cache_size, scan=args.scan,
+             ean_check=args.ean_check, metrics_path=args.metrics)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
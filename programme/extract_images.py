@@ -1,67 +1,455 @@
 import os
-import fitz  # PyMuPDF
-from PIL import Image
 import io
+import re
+import json
+import time
+import hashlib
+import argparse
+
+from extraction_cache import file_sha256
+import metrics
+from metrics import FileMetrics
+
+MANIFEST_NAME = 'image_manifest.json'
+MANIFEST_VERSION = 2
+
+# Politique de sortie des images:
+#   format             : "png" (ré-encodage), "native" (octets d'origine écrits tels
+#                        quels pour les JPEG/PNG, PNG sinon) ou "webp"
+#   png_compress_level : 0 (rapide, gros fichiers) à 9 (lent); 6 = défaut de Pillow
+#   quality            : qualité WebP/JPEG (JPEG seulement si "native" doit réduire l'image)
+#   max_dim            : plus grand côté en pixels, None pour garder la taille d'origine
+IMAGE_FORMATS = ('png', 'native', 'webp')
+DEFAULT_IMAGE_POLICY = {
+    'format': 'png',
+    'png_compress_level': 6,
+    'quality': 80,
+    'max_dim': None,
+}
+_NATIVE_EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'jpg': 'jpg'}
+# Nom des images extraites: {pdf}-{n}.{extension}
+_EXTRACTED_IMAGE_NAME = re.compile(r'.+-\d+\.(png|jpg|webp)', re.IGNORECASE)
+
+
+def output_extension(base_image, policy):
+    """Returns (extension, passthrough) for an image returned by doc.extract_image."""
+    native = _NATIVE_EXTENSIONS.get(base_image.get('ext', '').lower())
+    if policy['format'] == 'webp':
+        return 'webp', False
+    if policy['format'] == 'native' and native:
+        max_dim = policy['max_dim']
+        fits = not max_dim or max(base_image.get('width', 0), base_image.get('height', 0)) <= max_dim
+        return native, fits
+    return 'png', False
+
+
+def encode_image(image_bytes, output_path, policy=DEFAULT_IMAGE_POLICY):
+    """Decodes extracted image bytes, downscales them to policy['max_dim'] and
+    saves them in the format of output_path's extension. Returns the bytes
+    written. Runs in the process pool when one is used."""
+    from PIL import Image
+    image = Image.open(io.BytesIO(image_bytes))
+    if policy['max_dim']:
+        # thumbnail() décode les JPEG directement à échelle réduite
+        image.thumbnail((policy['max_dim'], policy['max_dim']))
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension == '.png':
+        if image.mode == 'CMYK':
+            image = image.convert('RGB')
+        image.save(output_path, "PNG", compress_level=policy['png_compress_level'])
+    elif extension == '.webp':
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.mode else 'RGB')
+        image.save(output_path, "WEBP", quality=policy['quality'])
+    else:
+        if image.mode not in ('RGB', 'L', 'CMYK'):
+            image = image.convert('RGB')
+        image.save(output_path, "JPEG", quality=policy['quality'])
+    return os.path.getsize(output_path)
+
+
+def _timed_encode_image(image_bytes, output_path, policy=DEFAULT_IMAGE_POLICY):
+    """encode_image for the process pool: returns (bytes written, seconds)."""
+    start = time.perf_counter()
+    size = encode_image(image_bytes, output_path, policy)
+    return size, time.perf_counter() - start
+
+
+def new_manifest(policy=DEFAULT_IMAGE_POLICY):
+    """Manifest of the output folder: unique images by content hash, and for
+    each processed PDF its content hash and the (page, index) -> image file
+    mapping. It is kept between runs to only process new or modified PDFs."""
+    return {'version': MANIFEST_VERSION, 'policy': dict(policy), 'images': {}, 'pdfs': {}}
+
+
+def load_manifest(output_dir, policy=DEFAULT_IMAGE_POLICY, reset=False):
+    """Returns the manifest of output_dir, or a new one if there is none or if
+    it is unreadable, or was written by another version or with another
+    output policy: the image files it lists are then deleted, as they are all
+    re-extracted (for an unreadable manifest, every file named like an
+    extracted image). With reset, a new manifest is always returned and the
+    image files of the existing one are deleted in the same way."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return new_manifest(policy)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Manifest '{path}' unreadable ({e}), all PDFs will be processed.")
+        for name in os.listdir(output_dir):
+            if _EXTRACTED_IMAGE_NAME.fullmatch(name):
+                _remove_image_file(output_dir, name)
+        return new_manifest(policy)
+    images = manifest.get('images') if isinstance(manifest, dict) else None
+    if not isinstance(images, dict) or manifest.get('version') != MANIFEST_VERSION:
+        print(f"Manifest '{path}' written by another version, all PDFs will be processed.")
+    elif manifest.get('policy') != dict(policy):
+        print("Image format policy changed since the last run, all PDFs will be processed.")
+    elif not reset:
+        return manifest
+    for name in (images or {}).values():
+        if isinstance(name, str):
+            _remove_image_file(output_dir, os.path.basename(name))
+    return new_manifest(policy)
+
+
+def _remove_image_file(output_dir, name):
+    try:
+        os.remove(os.path.join(output_dir, name))
+    except FileNotFoundError:
+        pass
+
+
+def pdf_unchanged(manifest, pdf_path):
+    """True if pdf_path was already processed with its current content. The
+    content hash is only recomputed when size or mtime changed."""
+    record = manifest['pdfs'].get(os.path.basename(pdf_path))
+    if record is None:
+        return False
+    st = os.stat(pdf_path)
+    if record['size'] == st.st_size and record['mtime_ns'] == st.st_mtime_ns:
+        return True
+    if record['size'] == st.st_size and record['sha256'] == file_sha256(pdf_path):
+        record['mtime_ns'] = st.st_mtime_ns
+        return True
+    return False
+
+
+def record_pdf(manifest, pdf_path):
+    """Stores the content hash of a processed PDF (if its extraction did not fail)."""
+    record = manifest['pdfs'].get(os.path.basename(pdf_path))
+    if record is not None:
+        st = os.stat(pdf_path)
+        record.update(size=st.st_size, mtime_ns=st.st_mtime_ns, sha256=file_sha256(pdf_path))
+
+
+def remove_unreferenced_images(manifest, output_dir):
+    """Deletes the image files no processed PDF refers to any more. Returns their number."""
+    referenced = {entry['file'] for record in manifest['pdfs'].values() for entry in record['images']}
+    removed = 0
+    for content_hash, name in list(manifest['images'].items()):
+        if name not in referenced:
+            _remove_image_file(output_dir, name)
+            del manifest['images'][content_hash]
+            removed += 1
+    return removed
+
+
+def release_pdf_images(manifest, pdf_filename, output_dir, taken):
+    """Drops the record of a PDF about to be processed again and deletes the
+    images no other PDF refers to, so that its new images are numbered from
+    {pdf}-1 again. Returns the released file names."""
+    record = manifest['pdfs'].pop(pdf_filename, None)
+    if record is None:
+        return set()
+    released = {entry['file'] for entry in record['images'] if entry['file']}
+    released -= {entry['file'] for other in manifest['pdfs'].values() for entry in other['images']}
+    for content_hash, name in list(manifest['images'].items()):
+        if name in released:
+            _remove_image_file(output_dir, name)
+            del manifest['images'][content_hash]
+    taken -= released
+    return released
+
+
+def wait_for_slot(jobs, max_pending):
+    """Blocks until the encoding submitted max_pending jobs ago has finished.
+    The pool runs them in order, so about max_pending encodings (and their
+    image bytes) are held at a time."""
+    if len(jobs) >= max_pending:
+        from concurrent.futures import wait
+        wait([jobs[-max_pending][0]])
+
+
+def extract_and_convert_images(pdf_path, output_dir, manifest=None, executor=None, jobs=None,
+                               policy=DEFAULT_IMAGE_POLICY, taken=None, file_metrics=None, max_pending=None):
+    """Extracts images from a PDF, converts them according to policy, and saves them.
+
+    An image xref shared by several pages is decoded once, and an image whose
+    content hash is already in manifest['images'] (this run or an earlier
+    one) is not saved again: the manifest entry of the page points to the
+    existing file. taken is the set of image file names in use, new images
+    get the next free {pdf}-{n} name.
+    With an executor the encoding is submitted to it and the pending
+    (future, file name, description) are appended to jobs, waiting before
+    each submission while max_pending (default: twice the CPU count) are in
+    flight; otherwise images are encoded here. Images kept in their native
+    format are written directly. Stage timings (open, image_decode, hash,
+    encode, encode_wait) and counters are added to file_metrics if given;
+    the encodings done in the pool return (bytes written, seconds).
+    Returns the number of images queued or saved."""
+    import fitz  # PyMuPDF
+    if file_metrics is None:
+        file_metrics = FileMetrics('images', os.path.basename(pdf_path))
+    if manifest is None:
+        manifest = new_manifest(policy)
+    if taken is None:
+        taken = set(manifest['images'].values())
+    if max_pending is None:
+        max_pending = 2 * (os.cpu_count() or 1)
+    pdf_filename = os.path.basename(pdf_path)
+    pdf_filename_base = os.path.splitext(pdf_filename)[0]
+    entries = []
+    manifest['pdfs'][pdf_filename] = {'size': None, 'mtime_ns': None, 'sha256': None, 'images': entries}
+    image_count_for_pdf = 0
+    name_counter = 0
 
-def extract_and_convert_images(pdf_path, output_dir):
-    """Extracts images from a PDF, converts them to PNG, and saves them."""
     try:
-        doc = fitz.open(pdf_path)
-        pdf_filename_base = os.path.splitext(os.path.basename(pdf_path))[0]
-        image_count_for_pdf = 0
+        with file_metrics.stage('open'):
+            doc = fitz.open(pdf_path)
+        xref_files = {}  # xref -> fichier, pour les images partagées entre pages
 
         for page_num in range(len(doc)):
             for img_index, img in enumerate(doc.get_page_images(page_num, full=True)):
                 xref = img[0]
-                base_image = doc.extract_image(xref)
-                image_bytes = base_image["image"]
+                entry = {'page': page_num + 1, 'index': img_index, 'file': None}
+                entries.append(entry)
+                file_metrics.count('images')
+                if xref in xref_files:
+                    file_metrics.count('duplicates')
+                    entry['file'] = xref_files[xref]
+                    continue
 
-                # Convert to PNG using Pillow
                 try:
-                    image = Image.open(io.BytesIO(image_bytes))
+                    with file_metrics.stage('image_decode'):
+                        base_image = doc.extract_image(xref)
+                        image_bytes = base_image["image"]
+                except Exception as img_e:
+                    print(f"Could not process image {img_index} on page {page_num+1} in {pdf_filename}: {img_e}")
+                    continue
+
+                with file_metrics.stage('hash'):
+                    content_hash = hashlib.sha256(image_bytes).hexdigest()
+                existing = manifest['images'].get(content_hash)
+                if existing is not None:
+                    file_metrics.count('duplicates')
+                else:
                     image_count_for_pdf += 1
-                    
+                    extension, passthrough = output_extension(base_image, policy)
                     # New filename format: R12345-1.png
-                    new_filename = f"{pdf_filename_base}-{image_count_for_pdf}.png"
-                    output_path = os.path.join(output_dir, new_filename)
-                    
-                    image.save(output_path, "PNG")
-                except Exception as img_e:
-                    print(f"Could not process image {img_index} on page {page_num+1} in {os.path.basename(pdf_path)}: {img_e}")
+                    name_counter += 1
+                    while f"{pdf_filename_base}-{name_counter}.{extension}" in taken:
+                        name_counter += 1
+                    existing = f"{pdf_filename_base}-{name_counter}.{extension}"
+                    taken.add(existing)
+                    manifest['images'][content_hash] = existing
+                    output_path = os.path.join(output_dir, existing)
+                    description = f"image {img_index} on page {page_num+1} in {pdf_filename}"
+                    file_metrics.count('images_saved')
+                    if passthrough:
+                        with file_metrics.stage('encode'), open(output_path, 'wb') as f:
+                            f.write(image_bytes)
+                        file_metrics.count('bytes_written', len(image_bytes))
+                    elif executor is not None:
+                        with file_metrics.stage('encode_wait'):
+                            wait_for_slot(jobs, max_pending)
+                        jobs.append((executor.submit(_timed_encode_image, image_bytes, output_path, policy),
+                                     existing, description))
+                    else:
+                        try:
+                            with file_metrics.stage('encode'):
+                                file_metrics.count('bytes_written', encode_image(image_bytes, output_path, policy))
+                        except Exception as img_e:
+                            print(f"Could not process {description}: {img_e}")
+                            _forget_image(manifest, existing)
+                            existing = None
+                xref_files[xref] = existing
+                entry['file'] = existing
 
         doc.close()
         if image_count_for_pdf > 0:
-            print(f"Successfully extracted and converted {image_count_for_pdf} images from {os.path.basename(pdf_path)}")
+            print(f"Successfully extracted {image_count_for_pdf} new images from {pdf_filename}")
         else:
-            print(f"No images found in {os.path.basename(pdf_path)}")
+            print(f"No new images found in {pdf_filename}")
 
     except Exception as e:
-        print(f"Error processing file {os.path.basename(pdf_path)}: {e}")
+        print(f"Error processing file {pdf_filename}: {e}")
+        # Pas d'empreinte enregistrée: le PDF sera retraité au prochain passage
+        del manifest['pdfs'][pdf_filename]
+    return image_count_for_pdf
+
+
+def _forget_image(manifest, filename):
+    """Removes an image that could not be saved from the manifest."""
+    for content_hash, name in list(manifest['images'].items()):
+        if name == filename:
+            del manifest['images'][content_hash]
+    for record in manifest['pdfs'].values():
+        for entry in record['images']:
+            if entry['file'] == filename:
+                entry['file'] = None
+
+
+def write_manifest(manifest, output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
 
-def main():
-    """Main function to process PDFs starting with 'R'."""
-    pdf_directory = os.path.join(os.path.dirname(__file__), '../B Fiches techniques traitees')
-    output_directory = os.path.join(os.path.dirname(__file__), '../C image extraites')
+def main(pdf_directory=None, output_directory=None, workers=None, policy=None, incremental=True,
+         metrics_path=None):
+    """Main function to process PDFs starting with 'R'.
+
+    Image encoding runs in a pool of `workers` processes (default: number of
+    CPUs, 1 to encode in this process). policy overrides keys of
+    DEFAULT_IMAGE_POLICY. With incremental, PDFs already processed with the
+    same content (according to the manifest of the output folder) are
+    skipped, and images of PDFs removed from folder B are deleted; without
+    it, the images of the previous manifest are deleted and all PDFs are
+    extracted again. With metrics_path, per-PDF stage timings and counters
+    are written there."""
+    policy = {**DEFAULT_IMAGE_POLICY, **(policy or {})}
+    if pdf_directory is None:
+        pdf_directory = os.path.join(os.path.dirname(__file__), '../B Fiches techniques traitees')
+    if output_directory is None:
+        output_directory = os.path.join(os.path.dirname(__file__), '../C image extraites')
+    if workers is None:
+        workers = os.cpu_count() or 1
 
     if not os.path.isdir(pdf_directory):
         print(f"Error: Directory not found at '{pdf_directory}'")
         return
-        
+
     if not os.path.exists(output_directory):
         os.makedirs(output_directory)
 
     print(f"Searching for PDF files starting with 'R' in: {pdf_directory}")
     print(f"Saving extracted images to: {output_directory}\n")
 
-    for filename in os.listdir(pdf_directory):
-        # Only process PDFs starting with 'R' (case-insensitive)
-        if filename.lower().startswith('r') and filename.lower().endswith('.pdf'):
-            print(f"--- Processing file: {filename} ---")
+    start = time.time()
+    manifest = load_manifest(output_directory, policy, reset=not incremental)
+    # Only process PDFs starting with 'R' (case-insensitive)
+    pdf_files = [filename for filename in sorted(os.listdir(pdf_directory))
+                 if filename.lower().startswith('r') and filename.lower().endswith('.pdf')]
+    present = set(pdf_files)
+    removed_pdfs = [name for name in manifest['pdfs'] if name not in present]
+    for name in removed_pdfs:
+        del manifest['pdfs'][name]
+    images_before = set(manifest['images'].values())
+    taken = set(images_before)
+    released_images = set()  # images des PDF modifiés, supprimées avant leur retraitement
+    jobs = []
+    job_metrics = []  # FileMetrics du PDF de chaque encodage en attente
+    pdf_metrics = []
+    processed = []
+    skipped = 0
+    executor = None
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        for filename in pdf_files:
             pdf_path = os.path.join(pdf_directory, filename)
-            extract_and_convert_images(pdf_path, output_directory)
+            if pdf_unchanged(manifest, pdf_path):
+                skipped += 1
+                continue
+            print(f"--- Processing file: {filename} ---")
+            file_metrics = FileMetrics('images', filename)
+            released = release_pdf_images(manifest, filename, output_directory, taken)
+            images_before -= released
+            released_images |= released
+            first_job = len(jobs)
+            extract_and_convert_images(pdf_path, output_directory, manifest, executor, jobs, policy, taken,
+                                       file_metrics, max_pending=2 * workers)
+            pdf_metrics.append(file_metrics.finish())
+            job_metrics += [file_metrics] * (len(jobs) - first_job)
+            processed.append(pdf_path)
             print("-" * (len(filename) + 22) + "\n")
 
+        # Attendre la fin des encodages lancés dans le pool
+        for (future, image_file, description), file_metrics in zip(jobs, job_metrics):
+            try:
+                size, seconds = future.result()
+                file_metrics.add_time('encode', seconds)
+                file_metrics.count('bytes_written', size)
+            except Exception as img_e:
+                print(f"Could not process {description}: {img_e}")
+                _forget_image(manifest, image_file)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for pdf_path in processed:
+        record_pdf(manifest, pdf_path)
+    processed_records = [manifest['pdfs'][os.path.basename(pdf_path)] for pdf_path in processed
+                         if os.path.basename(pdf_path) in manifest['pdfs']]
+    deleted = remove_unreferenced_images(manifest, output_directory)
+    deleted += len(released_images - set(manifest['images'].values()))
+    manifest_path = write_manifest(manifest, output_directory)
+    elapsed = max(time.time() - start, 1e-9)
+    pdf_count = len(processed)
+    references = sum(1 for record in processed_records for entry in record['images'] if entry['file'])
+    new_images = set(manifest['images'].values()) - images_before
+    unique = len(new_images)
+    written = sum(os.path.getsize(os.path.join(output_directory, name)) for name in new_images)
     print("\nImage extraction complete.")
+    print(f"{pdf_count} PDF processed, {skipped} skipped (unchanged), {len(removed_pdfs)} removed "
+          f"({deleted} image(s) deleted).")
+    print(f"{references} image(s) referenced, {unique} new unique image(s) saved "
+          f"({references - unique} duplicate(s) skipped), manifest '{manifest_path}'.")
+    print(f"{elapsed:.2f} s: {pdf_count / elapsed:.1f} PDF/s, {unique / elapsed:.1f} images/s, "
+          f"{written / (1024 * 1024) / elapsed:.1f} Mo/s written ({workers} worker(s), format '{policy['format']}').")
+    if metrics_path:
+        with metrics.open_metrics(metrics_path) as metrics_writer:
+            for file_metrics in pdf_metrics:
+                metrics_writer.write(file_metrics)
+
+DESCRIPTION = "Extract the images of the R* PDFs of folder B."
+
+
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, default=None,
+                        help="image encoding processes (default: number of CPUs, 1 = no pool)")
+    parser.add_argument("--format", choices=IMAGE_FORMATS, default=DEFAULT_IMAGE_POLICY['format'],
+                        help="png: re-encode as PNG; native: keep JPEG/PNG bytes as extracted; webp")
+    parser.add_argument("--png-compress-level", type=int, choices=range(10),
+                        default=DEFAULT_IMAGE_POLICY['png_compress_level'], metavar="0-9")
+    parser.add_argument("--quality", type=int, default=DEFAULT_IMAGE_POLICY['quality'],
+                        help="WebP/JPEG quality (1-100)")
+    parser.add_argument("--max-dim", type=int, default=None,
+                        help="downscale images whose largest side exceeds this many pixels")
+    parser.add_argument("--full", action="store_true",
+                        help="delete the extracted images and process every PDF again, "
+                             "instead of only the new or modified ones")
+    metrics.add_arguments(parser)
+
+
+def run(args):
+    policy = {
+        'format': args.format,
+        'png_compress_level': args.png_compress_level,
+        'quality': args.quality,
+        'max_dim': args.max_dim,
+    }
+    with metrics.profiled(args.profile):
+        main(workers=args.workers, incremental=not args.full, policy=policy, metrics_path=args.metrics)
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import hashlib
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file's content."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """Persistent cache of extract_ean_from_pdf results, keyed by PDF content hash.
+
+    A (size, mtime) record per path avoids re-hashing files that did not
+    change. Entries computed with another rules version are ignored, and
+    the least recently used entries are evicted above max_entries."""
+
+    def __init__(self, path, rules_version, max_entries=10000):
+        self.path = path
+        self.rules_version = rules_version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}  # sha256 -> {"codes", "fournisseur", "version", "last_used"}
+        self._files = {}    # chemin absolu -> {"size", "mtime_ns", "sha256"}
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            self._entries = data.get('entries', {})
+            self._files = data.get('files', {})
+        except (OSError, ValueError) as e:
+            print(f"Cache ignored ('{self.path}' unreadable: {e})")
+
+    def content_key(self, pdf_path):
+        """Returns the content hash of pdf_path, reusing the stored one if size and mtime are unchanged."""
+        abs_path = os.path.abspath(pdf_path)
+        st = os.stat(abs_path)
+        known = self._files.get(abs_path)
+        if known and known['size'] == st.st_size and known['mtime_ns'] == st.st_mtime_ns:
+            return known['sha256']
+        key = file_sha256(abs_path)
+        self._files[abs_path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': key}
+        return key
+
+    def get(self, key):
+        """Returns the cached (codes, fournisseur) for key, or None (counted as a miss)."""
+        entry = self._entries.get(key)
+        # Les entrées sans pages (anciens caches) sont réanalysées une fois
+        if entry is None or entry['version'] != self.rules_version or 'pages' not in entry:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry['last_used'] = time.time()
+        return list(entry['codes']), entry['fournisseur']
+
+    def pages(self, key):
+        """Returns the cached {code: page} for key ({} if unknown)."""
+        entry = self._entries.get(key)
+        return dict(entry.get('pages') or {}) if entry else {}
+
+    def put(self, key, codes, fournisseur, pages=None):
+        self._entries[key] = {
+            'codes': list(codes),
+            'fournisseur': fournisseur,
+            'pages': dict(pages or {}),
+            'version': self.rules_version,
+            'last_used': time.time(),
+        }
+
+    def _evict(self):
+        if len(self._entries) > self.max_entries:
+            by_age = sorted(self._entries, key=lambda k: self._entries[k]['last_used'])
+            for key in by_age[:len(self._entries) - self.max_entries]:
+                del self._entries[key]
+        # Oublier les fichiers déplacés/supprimés et ceux dont l'entrée a été évincée
+        self._files = {p: info for p, info in self._files.items()
+                       if info['sha256'] in self._entries and os.path.exists(p)}
+
+    def save(self):
+        self._evict()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self._entries, 'files': self._files}, f)
+        os.replace(tmp_path, self.path)
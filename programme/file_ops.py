@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import shutil
+
+# auto: reflink si le système de fichiers le permet, sinon copie. Un lien physique partage le
+# fichier (une modification de l'un modifie l'autre): uniquement sur demande explicite
+COPY_MODES = ('auto', 'reflink', 'hardlink', 'copy')
+
+_FICLONE = 0x40049409  # ioctl Linux (btrfs, XFS, ...)
+
+
+class FileOpStats:
+    """Counters of the file operations done by execute_plan."""
+
+    def __init__(self):
+        self.copies = 0
+        self.hardlinks = 0
+        self.reflinks = 0
+        self.moves = 0
+        self.bytes_written = 0
+        self.seconds = 0.0
+
+    @property
+    def files_created(self):
+        return self.copies + self.hardlinks + self.reflinks + self.moves
+
+    def summary(self):
+        return (f"{self.files_created} fichier(s) créé(s) ({self.copies} copie(s), {self.hardlinks} lien(s) physique(s), "
+                f"{self.reflinks} reflink(s), {self.moves} déplacement(s)), "
+                f"{self.bytes_written / (1024 * 1024):.1f} Mo écrits en {self.seconds:.2f} secondes")
+
+
+class DestinationRegistry:
+    """Allocates free file names in a destination folder from a single listing.
+
+    allocate() returns name.ext if free, otherwise the first free name_1.ext,
+    name_2.ext... like probing with os.path.exists, but without any stat call:
+    taken names and the next counter of each name are kept in memory."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        self._taken = {os.path.normcase(name) for name in names}
+        self._next_counter = {}
+
+    def _reserve(self, filename):
+        self._taken.add(os.path.normcase(filename))
+        return os.path.join(self.directory, filename)
+
+    def allocate(self, filename):
+        """Reserves and returns a free path for filename in the directory."""
+        if os.path.normcase(filename) not in self._taken:
+            return self._reserve(filename)
+        base, extension = os.path.splitext(filename)
+        key = os.path.normcase(filename)
+        counter = self._next_counter.get(key, 1)
+        while os.path.normcase(f"{base}_{counter}{extension}") in self._taken:
+            counter += 1
+        self._next_counter[key] = counter + 1
+        return self._reserve(f"{base}_{counter}{extension}")
+
+
+def reflink(src, dst):
+    """Clones src to dst sharing the data blocks (copy-on-write). Raises OSError if not supported."""
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                os.remove(dst)
+                raise
+    elif sys.platform == 'darwin':
+        import ctypes
+        libc = ctypes.CDLL('libc.dylib', use_errno=True)
+        if libc.clonefile(os.fsencode(src), os.fsencode(dst), 0) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), dst)
+    else:
+        raise OSError(f"reflink not supported on {sys.platform}")
+    shutil.copystat(src, dst)
+
+
+def place_copy(src, dst, mode='auto', stats=None):
+    """Creates dst with the content of src using the cheapest method allowed by mode,
+    falling back to a plain copy. Returns the method used."""
+    attempts = {
+        'auto': ('reflink',),
+        'reflink': ('reflink',),
+        'hardlink': ('hardlink',),
+        'copy': (),
+    }[mode]
+    for method in attempts:
+        try:
+            if method == 'reflink':
+                reflink(src, dst)
+                if stats is not None:
+                    stats.reflinks += 1
+            else:
+                os.link(src, dst)
+                if stats is not None:
+                    stats.hardlinks += 1
+            return method
+        except (OSError, NotImplementedError, AttributeError):
+            continue
+
+    shutil.copy2(src, dst)
+    if stats is not None:
+        stats.copies += 1
+        stats.bytes_written += os.path.getsize(dst)
+    return 'copy'
+
+
+def execute_plan(src, destinations, mode='auto', stats=None):
+    """Creates every destination from src, then removes src.
+
+    All destinations but the last are created with place_copy; src is then
+    renamed to the last one, so a single destination costs no I/O at all.
+    If that rename fails, src is kept. Returns the list of created paths."""
+    start = time.time()
+    created = []
+    for dst in destinations[:-1]:
+        try:
+            place_copy(src, dst, mode, stats)
+            created.append(dst)
+        except OSError as e:
+            print(f"Error creating '{os.path.basename(dst)}': {e}")
+
+    if destinations:
+        last = destinations[-1]
+        try:
+            try:
+                os.replace(src, last)
+                if stats is not None:
+                    stats.moves += 1
+            except OSError:
+                # Autre disque: copie puis suppression
+                place_copy(src, last, 'copy', stats)
+                os.remove(src)
+            created.append(last)
+        except OSError as e:
+            print(f"Error creating '{os.path.basename(last)}': {e}")
+
+    if stats is not None:
+        stats.seconds += time.time() - start
+    return created
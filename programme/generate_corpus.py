@@ -0,0 +1,211 @@
+import os
+import io
+import random
+import argparse
+import fitz  # PyMuPDF
+import openpyxl
+from PIL import Image
+from product_index import BRAND_COL_INDEX, EAN_COL_INDEX, HEADER_ROW, PRODUCT_NAME_COL_INDEX, REF_FOURN_COL_INDEX
+
+
+def random_ean13(rng):
+    """Returns a random 13-digit EAN code with a valid check digit."""
+    digits = [rng.randint(0, 9) for _ in range(12)]
+    total = sum(d * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    check = (10 - total % 10) % 10
+    return "".join(str(d) for d in digits) + str(check)
+
+
+def random_image(rng, size, fmt="PNG"):
+    """Returns the bytes of a size x size image with random coloured blocks."""
+    image = Image.new("RGB", (size, size), (255, 255, 255))
+    block = max(size // 8, 1)
+    for x in range(0, size, block):
+        for y in range(0, size, block):
+            color = (rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255))
+            image.paste(color, (x, y, x + block, y + block))
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **({"quality": 85} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+class SharedImages:
+    """Images reused across the corpus: a supplier logo in every PDF, and a
+    pictogram drawn on every page of a PDF (one xref shared by the pages)."""
+
+    def __init__(self, rng):
+        self.logo = random_image(rng, 64)
+        self.pictogram = random_image(rng, 32)
+
+
+def _write_lines(page, lines, start_y=72):
+    y = start_y
+    for line in lines:
+        page.insert_text((50, y), line, fontsize=9)
+        y += 12
+
+
+def generate_pdf(pdf_path, rng, pages=1, kind="EAN", images=None, photo_size=256):
+    """Creates one synthetic technical sheet.
+
+    kind is "EAN" (table of 13-digit codes on the first page), "LMA"
+    ("WORKWEAR 1880 <code>" plus the lma-lebeurre footer) or "AUTOBEST"
+    ("<code> AUTOBEST - BP 67" footer on the last page).
+    With images (a SharedImages), the first page gets the shared logo and a
+    product photo (JPEG) unique to this PDF, every page the shared pictogram.
+    Returns the codes a correct extraction should find."""
+    doc = fitz.open()
+    expected = []
+    pictogram_xref = 0
+    for page_num in range(pages):
+        page = doc.new_page(width=595, height=842)
+        if images is not None:
+            if page_num == 0:
+                page.insert_image(fitz.Rect(450, 20, 514, 84), stream=images.logo)
+                page.insert_image(fitz.Rect(300, 500, 556, 756),
+                                  stream=random_image(rng, photo_size, "JPEG"))
+            rect = fitz.Rect(520, 20, 552, 52)
+            if pictogram_xref:
+                page.insert_image(rect, xref=pictogram_xref)
+            else:
+                pictogram_xref = page.insert_image(rect, stream=images.pictogram)
+        lines = [f"Fiche technique - page {page_num + 1}/{pages}"]
+        # Texte de remplissage avec des nombres qui ne sont pas des EAN
+        lines += [f"Lot {rng.randint(100000, 999999)} - Tel 0{rng.randint(100000000, 999999999)}"
+                  for _ in range(20)]
+
+        if page_num == 0 and kind == "EAN":
+            for _ in range(rng.randint(2, 8)):
+                code = random_ean13(rng)
+                expected.append(code)
+                lines.append(f"Ref {rng.randint(1000, 9999)}   EAN {code}")
+
+        if page_num == 0 and kind == "LMA":
+            code = str(rng.randint(1000, 99999))
+            expected.append(code)
+            lines.append(f"WORKWEAR 1880 {code}")
+
+        if page_num == pages - 1:
+            if kind == "LMA":
+                lines.append("www.lma-lebeurre.com")
+            elif kind == "AUTOBEST":
+                code = str(rng.randint(100000, 999999))
+                expected.append(code)
+                lines.append(f"{code} AUTOBEST - BP 67 - 59000 LILLE")
+
+        _write_lines(page, lines)
+
+    doc.save(pdf_path)
+    doc.close()
+    return expected
+
+
+def generate_corpus(output_dir, count, pages=1, seed=0, images=False, prefix="Page_", photo_size=256):
+    """Generates `count` PDFs in output_dir and returns {filename: (codes, kind)}."""
+    rng = random.Random(seed)
+    shared_images = SharedImages(rng) if images else None
+    os.makedirs(output_dir, exist_ok=True)
+    expected = {}
+    for i in range(count):
+        kind = rng.choices(["EAN", "LMA", "AUTOBEST"], weights=[8, 1, 1])[0]
+        filename = f"{prefix}{kind}_{i:05d}.pdf"
+        codes = generate_pdf(os.path.join(output_dir, filename), rng, pages=pages, kind=kind,
+                             images=shared_images, photo_size=photo_size)
+        expected[filename] = (codes, kind)
+    return expected
+
+
+def _product_row(name, ean=None, ref_fourn=None, brand=None):
+    row = [None] * (BRAND_COL_INDEX + 1)
+    row[PRODUCT_NAME_COL_INDEX] = name
+    row[EAN_COL_INDEX] = ean
+    row[REF_FOURN_COL_INDEX] = ref_fourn
+    row[BRAND_COL_INDEX] = brand
+    return row
+
+
+def generate_workbook(workbook_path, expected, seed=0, missing=0.1, extra=3):
+    """Writes a FICHIER GENERAL.xlsx matching a corpus from generate_corpus.
+
+    Each expected code gets a product row (EAN in column E, AUTOBEST code in
+    column F, LMA references '<code> S', '<code>-1 XL'... in column F), except
+    a `missing` fraction left out to exercise the 'not found' path. Every
+    tenth EAN reuses the previous product name, as variants of one product.
+    `extra` catalogue rows per code are added for products without a PDF,
+    with codes that are not in expected. Product names start with 'R' so
+    extract_images processes the renamed files. Returns the number of
+    product rows."""
+    # Flux distinct de celui de generate_corpus (même seed): sinon les lignes
+    # supplémentaires retirent les mêmes EAN que le corpus
+    rng = random.Random(f"workbook-{seed}")
+    corpus_codes = {code for codes, _ in expected.values() for code in codes}
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "FICHIER GENERAL"
+    for i in range(HEADER_ROW - 1):
+        sheet.append([f"Catalogue synthétique - ligne {i + 1}"])
+    sheet.append(_product_row("Désignation", "EAN", "Ref Fourn", "Marque"))
+
+    rows = 0
+    product = 0
+    name = None
+    for filename in sorted(expected):
+        codes, kind = expected[filename]
+        for code in codes:
+            if rng.random() < missing:
+                continue
+            if kind == "LMA":
+                for k in range(rng.randint(1, 4)):
+                    product += 1
+                    sheet.append(_product_row(f"R{product:06d}", ref_fourn=f"{code}-{k} XL" if k else f"{code} S",
+                                              brand="LMA"))
+                    rows += 1
+                continue
+            if kind == "AUTOBEST":
+                product += 1
+                sheet.append(_product_row(f"R{product:06d}", ref_fourn=code, brand="AUTOBEST"))
+            else:
+                product += 1
+                if name is None or product % 10:
+                    name = f"R{product:06d}"
+                sheet.append(_product_row(name, ean=code, brand="ARTUB"))
+            rows += 1
+
+    for _ in range(extra * rows):
+        product += 1
+        brand = rng.choices(["ARTUB", "AUTOBEST", "LMA"], weights=[8, 1, 1])[0]
+        code = None
+        while code is None or code in corpus_codes:
+            code = random_ean13(rng) if brand == "ARTUB" else str(rng.randint(100000, 999999))
+        if brand == "ARTUB":
+            sheet.append(_product_row(f"R{product:06d}", ean=code, brand=brand))
+        else:
+            sheet.append(_product_row(f"R{product:06d}", ref_fourn=f"{code} X", brand=brand))
+        rows += 1
+
+    workbook.save(workbook_path)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic technical-sheet PDFs.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--images", action="store_true", help="add a shared logo, pictogram and product photo")
+    parser.add_argument("--prefix", default="Page_", help="file name prefix ('R' for folder B style names)")
+    parser.add_argument("--workbook", metavar="PATH", default=None,
+                        help="also write a matching product workbook (FICHIER GENERAL.xlsx format)")
+    args = parser.parse_args()
+
+    expected = generate_corpus(args.output_dir, args.count, pages=args.pages, seed=args.seed,
+                               images=args.images, prefix=args.prefix)
+    print(f"{args.count} PDF generated in '{args.output_dir}'")
+    if args.workbook:
+        rows = generate_workbook(args.workbook, expected, seed=args.seed)
+        print(f"{rows} product rows written to '{args.workbook}'")
+
+
+if __name__ == "__main__":
+    main()
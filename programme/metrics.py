@@ -0,0 +1,140 @@
+import os
+import csv
+import json
+import time
+import contextlib
+
+
+class FileMetrics:
+    """Per-stage timings (seconds) and counters of one file for one step
+    ('extract', 'rename', 'images'). Plain attributes, so it can be returned
+    by a process pool worker."""
+
+    def __init__(self, step, file):
+        self.step = step
+        self.file = file
+        self.timings = {}
+        self.counters = {}
+        self.total = None
+        self._start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Adds the time spent in the with block to the stage `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self):
+        """Fixes the total time of the file (first call only) and returns self."""
+        if self.total is None:
+            self.total = time.perf_counter() - self._start
+        return self
+
+    def as_record(self):
+        self.finish()
+        return {
+            'step': self.step,
+            'file': self.file,
+            'total': round(self.total, 6),
+            'timings': {name: round(seconds, 6) for name, seconds in self.timings.items()},
+            'counters': dict(self.counters),
+        }
+
+
+class MetricsWriter:
+    """Writes FileMetrics records to a JSON-lines file (one object per file),
+    or to a CSV file (one step;file;metric;value row per timing or counter)
+    if path ends with .csv. Keeps per-stage totals for summary()."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = 0
+        self._stage_totals = {}
+        self._counter_totals = {}
+        self._slowest = []  # (total, step, file)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._csv = None
+        if path.lower().endswith('.csv'):
+            self._csv = csv.writer(self._file, delimiter=';')
+            self._csv.writerow(['step', 'file', 'metric', 'value'])
+
+    def write(self, metrics):
+        record = metrics.as_record()
+        if self._csv is not None:
+            self._csv.writerow([record['step'], record['file'], 'total', record['total']])
+            for name, seconds in record['timings'].items():
+                self._csv.writerow([record['step'], record['file'], f'time_{name}', seconds])
+            for name, value in record['counters'].items():
+                self._csv.writerow([record['step'], record['file'], name, value])
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.records += 1
+        for name, seconds in record['timings'].items():
+            self._stage_totals[name] = self._stage_totals.get(name, 0.0) + seconds
+        for name, value in record['counters'].items():
+            self._counter_totals[name] = self._counter_totals.get(name, 0) + value
+        self._slowest = sorted(self._slowest + [(record['total'], record['step'], record['file'])],
+                               reverse=True)[:5]
+
+    def summary(self):
+        stages = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in
+                           sorted(self._stage_totals.items(), key=lambda item: -item[1]))
+        counters = ", ".join(f"{name} {value}" for name, value in self._counter_totals.items())
+        slowest = ", ".join(f"{file} ({total:.3f} s)" for total, _, file in self._slowest)
+        return (f"Métriques: {self.records} fichier(s) dans '{self.path}'.\n"
+                f"  temps par étape: {stages or '-'}\n"
+                f"  compteurs: {counters or '-'}\n"
+                f"  plus lents: {slowest or '-'}")
+
+    def close(self):
+        self._file.close()
+
+
+@contextlib.contextmanager
+def open_metrics(path):
+    """Yields a MetricsWriter for path, or None if path is None; prints the summary at the end."""
+    if path is None:
+        yield None
+        return
+    writer = MetricsWriter(path)
+    try:
+        yield writer
+    finally:
+        writer.close()
+        print(writer.summary())
+
+
+@contextlib.contextmanager
+def profiled(profile_path):
+    """Runs the with block under cProfile and dumps the stats to profile_path
+    (nothing if None). Only the current process is profiled, not pool workers."""
+    if profile_path is None:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+        print(f"Profil cProfile écrit dans '{profile_path}' (python -m pstats \"{profile_path}\").")
+
+
+def add_arguments(parser):
+    """--metrics / --profile options shared by the scripts."""
+    parser.add_argument("--metrics", metavar="PATH", default=None,
+                        help="write per-file stage timings and counters to PATH (.jsonl, or .csv)")
+    parser.add_argument("--profile", metavar="PATH", default=None,
+                        help="dump a cProfile of the run to PATH (main process only)")
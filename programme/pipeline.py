@@ -0,0 +1,248 @@
+import os
+import time
+import argparse
+
+import extract_images
+from extract_ean import CACHE_PATH, EAN_CHECKS, EXTRACTION_RULES_VERSION, SCAN_STRATEGIES, _analyze_pdf
+from extraction_cache import ExtractionCache
+from file_ops import COPY_MODES, DestinationRegistry, FileOpStats, execute_plan
+from product_index import load_product_index
+from results_store import ResultsStore, store_path_for
+from rename_files import plan_destinations, print_index_summary
+
+BASE_DIR = os.path.join(os.path.dirname(__file__), '..')
+PDF_DIRECTORY = os.path.join(BASE_DIR, 'A Fiches techniques a traiter')
+PROCESSED_DIRECTORY = os.path.join(BASE_DIR, 'B Fiches techniques traitees')
+IMAGE_DIRECTORY = os.path.join(BASE_DIR, 'C image extraites')
+PRODUCT_DB_PATH = os.path.join(BASE_DIR, 'FICHIER GENERAL.xlsx')
+INDEX_PATH = os.path.join(BASE_DIR, '.cache', 'product_index.bin')
+CSV_PATH = os.path.join(BASE_DIR, 'ean_codes.csv')
+STORE_PATH = store_path_for(CSV_PATH)
+
+_DONE = None  # fin de file
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def run_pipeline(pdf_directory=PDF_DIRECTORY, processed_directory=PROCESSED_DIRECTORY,
+                       image_directory=IMAGE_DIRECTORY, product_db_path=PRODUCT_DB_PATH, index_path=INDEX_PATH,
+                       workers=None, queue_size=None, copy_mode='auto', scan='full', ean_check='reject',
+                       use_cache=True, csv_path=None, images=True, image_policy=None, store_path=STORE_PATH):
+    """Streams every PDF of pdf_directory through code extraction, product
+    lookup, placement in processed_directory and image extraction of the R*
+    files created, as soon as the previous stage is done with it.
+
+    Stages are connected by queues of queue_size items (default: 2 per
+    worker); PDF analysis and image encoding run in a pool of `workers`
+    processes, file operations in threads. The product index is loaded
+    while the first PDFs are analysed. The extraction results are saved in
+    the results store at store_path, as by extract_ean.py; with csv_path
+    they are also exported there for review.
+    Returns {filename: latency in seconds}."""
+    import asyncio
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    loop = asyncio.get_running_loop()
+    if not os.path.exists(product_db_path):
+        print(f"Error: Product database '{product_db_path}' not found.")
+        return {}
+    if not os.path.isdir(pdf_directory):
+        print(f"Error: PDF directory '{pdf_directory}' not found.")
+        return {}
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or 2 * workers
+    image_policy = {**extract_images.DEFAULT_IMAGE_POLICY, **(image_policy or {})}
+    os.makedirs(processed_directory, exist_ok=True)
+    if images:
+        os.makedirs(image_directory, exist_ok=True)
+
+    filenames = sorted(f for f in os.listdir(pdf_directory) if f.lower().endswith('.pdf'))
+    print(f"{len(filenames)} PDF in '{pdf_directory}', {workers} worker(s).\n")
+
+    rules_version = f"{EXTRACTION_RULES_VERSION}-{scan}-{ean_check}"
+    cache = ExtractionCache(CACHE_PATH, rules_version) if use_cache else None
+    results = {}
+    code_pages = {}
+    started = {}
+    latencies = {}
+    image_failures = []
+    file_stats = FileOpStats()
+    extract_queue = asyncio.Queue(maxsize=queue_size)
+    place_queue = asyncio.Queue(maxsize=queue_size)
+    image_queue = asyncio.Queue(maxsize=queue_size)
+
+    def finished(filename):
+        latencies[filename] = time.perf_counter() - started[filename]
+        print(f"[{filename}] terminé en {latencies[filename] * 1000:.0f} ms")
+
+    async def produce():
+        for filename in filenames:
+            started[filename] = time.perf_counter()
+            await extract_queue.put(filename)
+        for _ in range(workers):
+            await extract_queue.put(_DONE)
+
+    async def extract():
+        while (filename := await extract_queue.get()) is not _DONE:
+            pdf_path = os.path.join(pdf_directory, filename)
+            try:
+                cached = key = None
+                if cache is not None:
+                    try:
+                        key = await loop.run_in_executor(None, cache.content_key, pdf_path)
+                        cached = cache.get(key)
+                    except OSError as e:
+                        print(f"Cache skipped for '{filename}': {e}")
+                if cached is not None:
+                    codes, fournisseur = cached
+                    code_pages[filename] = cache.pages(key)
+                else:
+                    _, codes, fournisseur, stats, _ = await loop.run_in_executor(pool, _analyze_pdf, pdf_path, scan,
+                                                                              ean_check)
+                    code_pages[filename] = stats['code_pages']
+                    if key is not None and not stats['error']:
+                        cache.put(key, codes, fournisseur, stats['code_pages'])
+            except Exception as e:
+                print(f"Error analyzing '{filename}': {e}")
+                codes, fournisseur = [], ""
+            results[filename] = (codes, fournisseur)
+            await place_queue.put((filename, codes, fournisseur))
+
+    async def place():
+        product_index = await index_loading
+        print_index_summary(product_index)
+        # Une seule lecture du dossier B pour tous les noms de destination
+        destinations = DestinationRegistry(processed_directory)
+        while (item := await place_queue.get()) is not _DONE:
+            filename, codes, fournisseur = item
+            if not codes:
+                print(f"Skipping '{filename}': No codes found.")
+                finished(filename)
+                continue
+            planned = plan_destinations(filename, codes, fournisseur, product_index, destinations)
+            if not planned:
+                print(f"No valid codes found for '{filename}'. File not renamed.")
+                finished(filename)
+                continue
+            created = await loop.run_in_executor(None, execute_plan, os.path.join(pdf_directory, filename),
+                                                 planned, copy_mode, file_stats)
+            r_files = [path for path in created if os.path.basename(path).lower().startswith('r')]
+            if images and r_files:
+                await image_queue.put((filename, r_files))
+            else:
+                finished(filename)
+        if images:
+            await image_queue.put(_DONE)
+
+    async def wait_encodings(filename, jobs):
+        for future, image_file, description in jobs:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception as img_e:
+                print(f"Could not process {description}: {img_e}")
+                image_failures.append(image_file)
+        finished(filename)
+
+    async def extract_pdf_images():
+        # Le manifeste n'est modifié que par cette étape (un fichier à la fois)
+        manifest = extract_images.load_manifest(image_directory, image_policy)
+        taken = set(manifest['images'].values())
+        encodings = []
+        processed = []
+        # Une seule liste pour tous les PDF: les encodages en cours sont bornés sur l'ensemble du flux
+        jobs = []
+        while (item := await image_queue.get()) is not _DONE:
+            filename, r_files = item
+            first_job = len(jobs)
+            for pdf_path in r_files:
+                extract_images.release_pdf_images(manifest, os.path.basename(pdf_path), image_directory, taken)
+                await loop.run_in_executor(None, extract_images.extract_and_convert_images, pdf_path,
+                                           image_directory, manifest, pool, jobs, image_policy, taken, None,
+                                           2 * workers)
+                processed.append(pdf_path)
+            encodings.append(asyncio.create_task(wait_encodings(filename, jobs[first_job:])))
+        await asyncio.gather(*encodings)
+        for image_file in image_failures:
+            extract_images._forget_image(manifest, image_file)
+        for pdf_path in processed:
+            extract_images.record_pdf(manifest, pdf_path)
+        extract_images.write_manifest(manifest, image_directory)
+
+    start = time.perf_counter()
+    try:
+        # 'spawn': le pool démarre ses processus à la demande, pendant que le thread de
+        # chargement de l'index importe pandas/numpy; un fork hériterait des verrous d'import
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            index_loading = loop.run_in_executor(None, load_product_index, product_db_path, index_path)
+
+            async def extract_stage():
+                await asyncio.gather(*(extract() for _ in range(workers)))
+                await place_queue.put(_DONE)
+
+            stages = [produce(), extract_stage(), place()]
+            if images:
+                stages.append(extract_pdf_images())
+            await asyncio.gather(*stages)
+    finally:
+        # Les codes déjà extraits sont conservés même si une étape a échoué
+        wall_time = time.perf_counter() - start
+        store = ResultsStore(store_path)
+        try:
+            store.put_results(results, code_pages)
+            store.retain(filenames)
+            print(f"\nResults saved to '{store_path}' ({store.summary()})")
+            if csv_path:
+                store.export_csv(csv_path, ean_check)
+                print(f"Results exported to '{csv_path}'")
+        finally:
+            store.close()
+        if cache is not None:
+            cache.save()
+
+    print(f"\nOpérations fichiers: {file_stats.summary()}.")
+    if latencies:
+        values = sorted(latencies.values())
+        print(f"Latence par PDF: moyenne {sum(values) / len(values) * 1000:.0f} ms, "
+              f"médiane {_percentile(values, 0.5) * 1000:.0f} ms, p95 {_percentile(values, 0.95) * 1000:.0f} ms, "
+              f"max {values[-1] * 1000:.0f} ms.")
+    print(f"Pipeline terminé: {len(filenames)} PDF en {wall_time:.2f} secondes "
+          f"({len(filenames) / max(wall_time, 1e-9):.1f} PDF/s).")
+    return latencies
+
+
+def main(**kwargs):
+    import asyncio
+    return asyncio.run(run_pipeline(**kwargs))
+
+
+DESCRIPTION = "Extract codes, rename into folder B and extract images in a single streaming pass."
+
+
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes for PDF analysis and image encoding (default: number of CPUs)")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="maximum items waiting between two stages (default: 2 per worker)")
+    parser.add_argument("--copy-mode", choices=COPY_MODES, default="auto")
+    parser.add_argument("--scan", choices=SCAN_STRATEGIES, default="full")
+    parser.add_argument("--ean-check", choices=EAN_CHECKS, default="reject")
+    parser.add_argument("--no-cache", action="store_true", help="re-analyse every PDF")
+    parser.add_argument("--csv", action="store_true",
+                        help="also write ean_codes.csv with the extracted codes, for manual review")
+    parser.add_argument("--no-images", action="store_true", help="skip the image extraction stage")
+    parser.add_argument("--format", choices=extract_images.IMAGE_FORMATS,
+                        default=extract_images.DEFAULT_IMAGE_POLICY['format'], help="image output format")
+
+
+def run(args):
+    main(workers=args.workers, queue_size=args.queue_size, copy_mode=args.copy_mode, scan=args.scan,
+         ean_check=args.ean_check, use_cache=not args.no_cache, csv_path=CSV_PATH if args.csv else None,
+         images=not args.no_images, image_policy={'format': args.format})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
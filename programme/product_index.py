@@ -0,0 +1,409 @@
+import os
+import sys
+import argparse
+import json
+import itertools
+import mmap
+import time
+import struct
+from extraction_cache import file_sha256
+
+# Fichier index compilé à partir de FICHIER GENERAL.xlsx, reconstruit
+# automatiquement quand le classeur change (date, taille puis contenu).
+INDEX_PATH = './.cache/product_index.bin'
+INDEX_MAGIC = b'OUTIDX01'
+INDEX_FORMAT_VERSION = 1
+
+# Column indices (0-based)
+PRODUCT_NAME_COL_INDEX = 3  # Column 4 (D) for Product Name
+EAN_COL_INDEX = 4           # Column 5 (E) for 13-digit EAN
+REF_FOURN_COL_INDEX = 5     # Column 6 (F) for Ref Four
+BRAND_COL_INDEX = 6         # Column 7 (G) for Brand ('AUTOBEST', 'LMA')
+
+HEADER_ROW = 7               # Ligne d'en-tête du fichier général (pd.read_excel header=6)
+STREAM_CHUNK_ROWS = 50000    # Lignes converties en maps à la fois par le chargement en flux
+_LOOKUP_COLUMNS = ['product_name', 'ean', 'ref_fourn', 'brand']
+
+# Valeurs texte lues comme manquantes par pd.read_excel (na_values par défaut)
+_NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+# Séparateurs des références LMA dans le fichier index
+_RECORD_SEP = '\x1e'
+_FIELD_SEP = '\x1f'
+
+
+def peak_rss_mb():
+    """Returns the peak resident memory of the process in MB, or None if unknown."""
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en Ko sous Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _windows_peak_rss_mb():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage',
+                    'QuotaPagedPoolUsage', 'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(
+                kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+    except (AttributeError, OSError):
+        return None
+
+
+def _cell_to_str(value):
+    """Converts an openpyxl cell value the way pd.read_excel(dtype=str) does (None if missing)."""
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value)
+    return None if value in _NA_STRINGS else value
+
+
+def iter_product_rows(product_db_path):
+    """Streams (product_name, ean, ref_fourn, brand) from columns D to G of the
+    workbook, from the row after the header, in read-only mode."""
+    import openpyxl
+    workbook = openpyxl.load_workbook(product_db_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        for row in sheet.iter_rows(min_row=HEADER_ROW + 1, min_col=PRODUCT_NAME_COL_INDEX + 1,
+                                   max_col=BRAND_COL_INDEX + 1, values_only=True):
+            values = tuple(_cell_to_str(value) for value in row)
+            if any(value is not None for value in values):
+                yield values + (None,) * (len(_LOOKUP_COLUMNS) - len(values))
+    finally:
+        workbook.close()
+
+
+def build_lookup_maps(db_df):
+    """Builds (ean_to_name_map, autobest_to_name_map, lma_code_to_refs) from the product dataframe.
+
+    The four useful columns are selected once and all three maps are built
+    with vectorized masks, string extraction and a groupby on the LMA base code."""
+    df = db_df.iloc[:, [PRODUCT_NAME_COL_INDEX, EAN_COL_INDEX, REF_FOURN_COL_INDEX, BRAND_COL_INDEX]].set_axis(
+        _LOOKUP_COLUMNS, axis=1)
+    return _maps_from_lookup_columns(df)
+
+
+def _maps_from_lookup_columns(df):
+    has_name = df['product_name'].notna()
+
+    # --- Create Mapping for 13-digit EANs ---
+    ean_rows = df[has_name & df['ean'].notna()]
+    ean_to_name_map = dict(zip(ean_rows['ean'], ean_rows['product_name']))
+
+    with_ref = df[has_name & df['ref_fourn'].notna()]
+
+    # --- Create Mapping for 6-digit AUTOBEST codes ---
+    autobest_rows = with_ref[with_ref['brand'] == 'AUTOBEST']
+    autobest_to_name_map = dict(zip(autobest_rows['ref_fourn'], autobest_rows['product_name']))
+
+    # --- Pour LMA: extraire tous les produits avec le même code de base ---
+    lma_rows = with_ref[with_ref['brand'] == 'LMA']
+    # Code de base = texte avant le premier espace ou tiret, d'au moins 4 chiffres
+    base_codes = lma_rows['ref_fourn'].str.extract(r'^([^-\s]*)', expand=False)
+    is_base_code = base_codes.str.isdigit() & (base_codes.str.len() >= 4)
+    lma_rows = lma_rows[is_base_code]
+    names = lma_rows['product_name'].to_numpy()
+    refs = lma_rows['ref_fourn'].to_numpy()
+    lma_code_to_refs = {
+        base_code: [{'product_name': names[i], 'ref_fourn': refs[i]} for i in positions]
+        for base_code, positions in lma_rows.groupby(base_codes[is_base_code], sort=False).indices.items()
+    }
+
+    return ean_to_name_map, autobest_to_name_map, lma_code_to_refs
+
+
+def stream_lookup_maps(product_db_path, chunk_rows=STREAM_CHUNK_ROWS, stats=None):
+    """Builds the lookup maps from the workbook without loading it whole.
+
+    Rows are streamed from the xlsx and turned into maps chunk by chunk, so
+    memory does not grow with the unused columns or the chunk count. If a dict
+    is passed as stats, 'rows', 'read_time' and 'mapping_time' are set in it."""
+    import pandas as pd
+    ean_to_name_map, autobest_to_name_map, lma_code_to_refs = {}, {}, {}
+    row_count = 0
+    read_time = 0.0
+    mapping_time = 0.0
+
+    rows = iter_product_rows(product_db_path)
+    while True:
+        start = time.time()
+        chunk = list(itertools.islice(rows, chunk_rows))
+        read_time += time.time() - start
+        if not chunk:
+            break
+        row_count += len(chunk)
+
+        start = time.time()
+        chunk_ean, chunk_autobest, chunk_lma = _maps_from_lookup_columns(
+            pd.DataFrame(chunk, columns=_LOOKUP_COLUMNS, dtype=object))
+        # Les blocs arrivent dans l'ordre du fichier: même résultat qu'en une fois
+        ean_to_name_map.update(chunk_ean)
+        autobest_to_name_map.update(chunk_autobest)
+        for base_code, refs in chunk_lma.items():
+            lma_code_to_refs.setdefault(base_code, []).extend(refs)
+        mapping_time += time.time() - start
+
+    if stats is not None:
+        stats.update(rows=row_count, read_time=read_time, mapping_time=mapping_time)
+    return ean_to_name_map, autobest_to_name_map, lma_code_to_refs
+
+
+def _encode_section(mapping, encode_value):
+    """Returns (header, [byte blocks]) for one map: sorted fixed-width keys,
+    value offsets and the concatenated UTF-8 values."""
+    import numpy as np
+    items = sorted((str(k).encode('utf-8'), encode_value(v).encode('utf-8')) for k, v in mapping.items())
+    width = max([len(k) for k, _ in items] + [1])
+    keys = np.array([k for k, _ in items], dtype=f'S{width}')
+    offsets = np.zeros(len(items) + 1, dtype='<i8')
+    offsets[1:] = np.cumsum([len(v) for _, v in items])
+    values = b''.join(v for _, v in items)
+    return {'count': len(items), 'width': width}, [keys.tobytes(), offsets.tobytes(), values]
+
+
+def write_index(index_path, source, ean_to_name_map, autobest_to_name_map, lma_code_to_refs):
+    """Writes the three lookup maps to a memory-mappable index file."""
+    sections = {
+        'ean': _encode_section(ean_to_name_map, str),
+        'autobest': _encode_section(autobest_to_name_map, str),
+        'lma': _encode_section(lma_code_to_refs, lambda refs: _RECORD_SEP.join(
+            f"{ref['product_name']}{_FIELD_SEP}{ref['ref_fourn']}" for ref in refs)),
+    }
+    header = {
+        'format': INDEX_FORMAT_VERSION,
+        'source': source,
+        'lma_products': sum(len(refs) for refs in lma_code_to_refs.values()),
+        'sections': {},
+    }
+
+    # Offsets relatifs au début des données, qui suivent l'en-tête
+    blocks = []
+    position = 0
+    for name, (section, data) in sections.items():
+        section = dict(section)
+        for field, block in zip(('keys_offset', 'offsets_offset', 'values_offset'), data):
+            position += (-position) % 8  # alignement des tableaux
+            section[field] = position
+            blocks.append((position, block))
+            position += len(block)
+        section['values_size'] = len(data[2])
+        header['sections'][name] = section
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _data_start(len(header_bytes))
+
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(INDEX_MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for offset, block in blocks:
+            f.seek(data_start + offset)
+            f.write(block)
+    os.replace(tmp_path, index_path)
+
+
+def _data_start(header_length):
+    # Les données commencent après l'en-tête, alignées sur 8 octets
+    position = len(INDEX_MAGIC) + 8 + header_length
+    return position + (-position) % 8
+
+
+def read_index_header(index_path):
+    """Returns the JSON header of an index file, or None if missing or not readable."""
+    try:
+        with open(index_path, 'rb') as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                return None
+            (length,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(length))
+            header['data_start'] = _data_start(length)
+    except (OSError, ValueError, struct.error):
+        return None
+    if header.get('format') != INDEX_FORMAT_VERSION:
+        return None
+    return header
+
+
+class IndexSection:
+    """Read-only mapping over one section of a memory-mapped index."""
+
+    def __init__(self, buffer, data_start, section, decode_value):
+        import numpy as np
+        self._count = section['count']
+        self._keys = np.frombuffer(buffer, dtype=f"S{section['width']}", count=self._count,
+                                   offset=data_start + section['keys_offset'])
+        self._offsets = np.frombuffer(buffer, dtype='<i8', count=self._count + 1,
+                                      offset=data_start + section['offsets_offset'])
+        self._values_start = data_start + section['values_offset']
+        self._buffer = buffer
+        self._decode_value = decode_value
+
+    def __len__(self):
+        return self._count
+
+    def _find(self, key):
+        encoded = str(key).encode('utf-8')
+        if not self._count or len(encoded) > self._keys.dtype.itemsize:
+            return -1
+        i = int(self._keys.searchsorted(encoded))
+        if i < self._count and self._keys[i] == encoded:
+            return i
+        return -1
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def get(self, key, default=None):
+        i = self._find(key)
+        if i < 0:
+            return default
+        return self._value(i)
+
+    def _value(self, i):
+        start = self._values_start + int(self._offsets[i])
+        end = self._values_start + int(self._offsets[i + 1])
+        return self._decode_value(self._buffer[start:end].decode('utf-8'))
+
+    def find_many(self, keys):
+        """Returns the positions of keys in the section (-1 if missing), with a
+        single searchsorted over all of them."""
+        import numpy as np
+        if not self._count or not len(keys):
+            return np.full(len(keys), -1, dtype=np.int64)
+        encoded = np.array([str(key).encode('utf-8') for key in keys])
+        # Les clés plus longues que la largeur de la section ne peuvent pas y être
+        fits = np.char.str_len(encoded) <= self._keys.dtype.itemsize
+        encoded = encoded.astype(self._keys.dtype)
+        positions = np.minimum(self._keys.searchsorted(encoded), self._count - 1)
+        found = fits & (self._keys[positions] == encoded)
+        return np.where(found, positions, -1)
+
+    def values_at(self, positions):
+        """Returns the decoded values at positions (from find_many, all >= 0),
+        each distinct value being decoded once."""
+        import numpy as np
+        unique, inverse = np.unique(np.asarray(positions, dtype=np.int64), return_inverse=True)
+        values = [self._value(i) for i in unique]
+        return [values[i] for i in inverse]
+
+
+def _decode_lma_refs(value):
+    return [dict(zip(('product_name', 'ref_fourn'), record.split(_FIELD_SEP)))
+            for record in value.split(_RECORD_SEP)]
+
+
+class ProductIndex:
+    """Memory-mapped product index exposing ean_to_name, autobest_to_name and lma_code_to_refs."""
+
+    def __init__(self, index_path):
+        self.header = read_index_header(index_path)
+        if self.header is None:
+            raise ValueError(f"'{index_path}' is not a valid product index")
+        self._file = open(index_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        data_start = self.header['data_start']
+        sections = self.header['sections']
+        self.ean_to_name = IndexSection(self._mmap, data_start, sections['ean'], str)
+        self.autobest_to_name = IndexSection(self._mmap, data_start, sections['autobest'], str)
+        self.lma_code_to_refs = IndexSection(self._mmap, data_start, sections['lma'], _decode_lma_refs)
+        self.lma_products = self.header['lma_products']
+
+    def close(self):
+        # Les tableaux numpy gardent une référence sur le mmap: on les libère d'abord
+        self.ean_to_name = self.autobest_to_name = self.lma_code_to_refs = None
+        self._mmap.close()
+        self._file.close()
+
+
+def _is_fresh(header, product_db_path):
+    if header is None:
+        return False
+    source = header['source']
+    st = os.stat(product_db_path)
+    if st.st_size != source['size']:
+        return False
+    if st.st_mtime_ns == source['mtime_ns']:
+        return True
+    # Date modifiée (copie, synchronisation...): on compare le contenu
+    return file_sha256(product_db_path) == source['sha256']
+
+
+def compile_index(product_db_path, index_path=INDEX_PATH):
+    """Reads the workbook and (re)writes the product index file."""
+    st = os.stat(product_db_path)
+    source = {
+        'path': os.path.abspath(product_db_path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'sha256': file_sha256(product_db_path),
+    }
+
+    print(f"Chargement du fichier Excel '{product_db_path}'...")
+    stats = {}
+    maps = stream_lookup_maps(product_db_path, stats=stats)
+    peak = peak_rss_mb()
+    peak_text = f"{peak:.0f} Mo" if peak is not None else "n/a"
+    print(f"Successfully loaded '{product_db_path}' en {stats['read_time']:.2f} secondes "
+          f"({stats['rows']} lignes, pic mémoire RSS {peak_text}).")
+
+    start_index = time.time()
+    write_index(index_path, source, *maps)
+    mapping_time = stats['mapping_time'] + time.time() - start_index
+    print(f"Création des mappings et de l'index '{index_path}' terminée en {mapping_time:.2f} secondes.")
+
+
+def load_product_index(product_db_path, index_path=INDEX_PATH, rebuild=False):
+    """Returns the ProductIndex of product_db_path, compiling it first if missing or out of date."""
+    start = time.time()
+    if rebuild or not _is_fresh(read_index_header(index_path), product_db_path):
+        compile_index(product_db_path, index_path)
+        return ProductIndex(index_path)
+    index = ProductIndex(index_path)
+    print(f"Index produits à jour '{index_path}' chargé en {(time.time() - start) * 1000:.1f} ms.")
+    return index
+
+
+DESCRIPTION = "Compile FICHIER GENERAL.xlsx into the product index used by the renaming."
+
+
+def add_arguments(parser):
+    parser.add_argument("product_db_path", nargs="?", default='./FICHIER GENERAL.xlsx')
+
+
+def run(args):
+    # Compilation explicite: python programme/product_index.py ["FICHIER GENERAL.xlsx"]
+    if not os.path.exists(args.product_db_path):
+        print(f"Error: Product database '{args.product_db_path}' not found.")
+    else:
+        compile_index(args.product_db_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
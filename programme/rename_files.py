@@ -1,32 +1,159 @@
 import os
-import pandas as pd
 import re
-import shutil
 import time
 import sys
-
-start_total = time.time()
+import argparse
+from product_index import INDEX_PATH, load_product_index
+from file_ops import COPY_MODES, DestinationRegistry, FileOpStats, execute_plan
+from results_store import ResultsStore, store_path_for
+import metrics
+from metrics import FileMetrics
 
 def sanitize_filename(filename):
     return re.sub(r'[\\/*?"<>|]', "", filename)
 
-def rename_pdfs():
-    """Renames PDF files based on EAN codes and an Excel mapping file."""
+def print_index_summary(product_index):
+    print(f"Created {len(product_index.ean_to_name)} mappings for 13-digit EANs.")
+    print(f"Created {len(product_index.autobest_to_name)} mappings for 6-digit AUTOBEST codes.")
+    print(f"Created mappings for {len(product_index.lma_code_to_refs)} LMA base codes "
+          f"with {product_index.lma_products} total products.")
+
+# Type de recherche selon le fournisseur du PDF (les autres fichiers sont cherchés par EAN)
+_LOOKUP_TYPES = {'EAN': "13-digit EAN", 'AUTOBEST': "6-digit AUTOBEST code", 'LMA': "LMA base code"}
+
+class RenamePlan:
+    """Result of build_rename_plan: the paths to create for each source PDF,
+    in order, one (source, code, product name, path) row per planned file,
+    and the codes not found per lookup type."""
+
+    def __init__(self):
+        self.destinations = {}  # fichier source -> chemins à créer dans le dossier B
+        self.rows = []
+        self.codes = 0
+        self.unmatched = {lookup: 0 for lookup in _LOOKUP_TYPES}
+        self.files_without_match = 0
+
+    def summary(self):
+        unmatched = ", ".join(f"{_LOOKUP_TYPES[lookup]} {count}" for lookup, count in self.unmatched.items() if count)
+        return (f"{len(self.rows)} fichier(s) prévu(s) pour {len(self.destinations)} PDF, "
+                f"{self.codes - sum(self.unmatched.values())}/{self.codes} code(s) trouvé(s) "
+                f"(non trouvés: {unmatched or 'aucun'}), {self.files_without_match} PDF sans correspondance")
+
+def build_rename_plan(entries, product_index, destinations):
+    """Matches all the codes of entries [(filename, fournisseur, codes)] against
+    the product index and returns the RenamePlan.
+
+    The codes are looked up section by section (EAN, AUTOBEST, LMA) with one
+    vectorized search each, the LMA base codes are expanded to all their
+    references, and the joined rows are sorted back to (file, code, reference)
+    order. Only the name allocation in destinations (a DestinationRegistry),
+    which depends on the previous names, is done row by row; no file is created.
+    AUTOBEST and EAN names are sanitized, LMA names are used as is."""
+    import numpy as np
+    plan = RenamePlan()
+    lookups = np.array([fournisseur if fournisseur in ('AUTOBEST', 'LMA') else 'EAN'
+                        for _, fournisseur, _ in entries], dtype=object)
+    code_counts = np.array([len(codes) for _, _, codes in entries], dtype=np.int64)
+    code_files = np.repeat(np.arange(len(entries)), code_counts)
+    code_lookups = lookups[code_files]
+    codes = np.array([code for _, _, file_codes in entries for code in file_codes], dtype=object)
+    plan.codes = len(codes)
+
+    sections = {'EAN': product_index.ean_to_name, 'AUTOBEST': product_index.autobest_to_name,
+                'LMA': product_index.lma_code_to_refs}
+    # Table jointe: code (indice dans codes), rang de la référence, nom du produit (None si non trouvé)
+    joined_codes, joined_ranks, joined_names, joined_counts = [], [], [], []
+    for lookup, section in sections.items():
+        code_rows = np.flatnonzero(code_lookups == lookup)
+        positions = section.find_many(codes[code_rows])
+        found = positions >= 0
+        values = section.values_at(positions[found])
+        if lookup == 'LMA':
+            # Un code de base LMA donne une ligne par référence
+            counts = np.array([len(refs) for refs in values], dtype=np.int64)
+            joined_codes.append(np.repeat(code_rows[found], counts))
+            joined_ranks.append(np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+            joined_names.append([ref['product_name'] for refs in values for ref in refs])
+            joined_counts.append(np.repeat(counts, counts))
+        else:
+            joined_codes.append(code_rows[found])
+            joined_ranks.append(np.zeros(len(values), dtype=np.int64))
+            joined_names.append(values)
+            joined_counts.append(np.ones(len(values), dtype=np.int64))
+        missing = code_rows[~found]
+        joined_codes.append(missing)
+        joined_ranks.append(np.zeros(len(missing), dtype=np.int64))
+        joined_names.append([None] * len(missing))
+        joined_counts.append(np.zeros(len(missing), dtype=np.int64))
+
+    joined_codes = np.concatenate(joined_codes)
+    joined_ranks = np.concatenate(joined_ranks)
+    joined_counts = np.concatenate(joined_counts)
+    joined_names = [name for names in joined_names for name in names]
+    order = np.lexsort((joined_ranks, joined_codes))
+
+    # Attribution des noms dans l'ordre des fichiers et des codes (name.pdf, name_1.pdf, ...)
+    code_files, codes, code_lookups = code_files.tolist(), codes.tolist(), code_lookups.tolist()
+    for code_row, rank, count, i in zip(joined_codes[order].tolist(), joined_ranks[order].tolist(),
+                                        joined_counts[order].tolist(), order.tolist()):
+        original_filename, _, _ = entries[code_files[code_row]]
+        code = codes[code_row]
+        lookup = code_lookups[code_row]
+        name = joined_names[i]
+        if name is None:
+            plan.unmatched[lookup] += 1
+            print(f"Code '{code}' from '{original_filename}': {_LOOKUP_TYPES[lookup]} not found in database.")
+            continue
+        _, extension = os.path.splitext(original_filename)
+        if lookup == 'LMA':
+            if rank == 0:
+                print(f"Found {count} products for LMA base code {code}")
+            new_path = destinations.allocate(f"{name}{extension}")
+            print(f"Planned file for LMA product '{name}' as '{os.path.basename(new_path)}'")
+        else:
+            new_path = destinations.allocate(f"{sanitize_filename(str(name))}{extension}")
+            print(f"Planned file for code '{code}' as '{os.path.basename(new_path)}'")
+        plan.destinations.setdefault(original_filename, []).append(new_path)
+        plan.rows.append((original_filename, code, name, new_path))
+    plan.files_without_match = sum(1 for filename, _, file_codes in entries
+                                   if file_codes and filename not in plan.destinations)
+    return plan
+
+def plan_destinations(original_filename, codes, fournisseur, product_index, destinations):
+    """Returns the paths to create in folder B for one PDF and its codes
+    (build_rename_plan for a single file).
+
+    AUTOBEST and EAN codes give one file named after the product, an LMA
+    base code one file per matching reference. Names are reserved in
+    destinations (a DestinationRegistry) but no file is created."""
+    plan = build_rename_plan([(original_filename, fournisseur, codes)], product_index, destinations)
+    return plan.destinations.get(original_filename, [])
+
+def rename_pdfs(rebuild_index=False, copy_mode='auto', metrics_path=None, dry_run=False):
+    """Renames PDF files based on EAN codes and an Excel mapping file.
+
+    The Excel file is read through the compiled product index (see
+    product_index.py), rebuilt only when the workbook changed. The files
+    to create for all the PDFs are planned first (build_rename_plan), then
+    created with copy_mode (see file_ops.execute_plan). With dry_run the
+    plan and the codes not found are only printed: nothing is created,
+    moved or deleted in folders A and B. With metrics_path, the lookup and
+    copy timings are written there (see metrics.py).
+
+    The codes are read from the results store written by extract_ean
+    (results_store.py); ean_codes.csv is imported into it first if it was
+    corrected by hand after the extraction."""
     start_total = time.time()
     # --- Configuration ---
     ean_csv_path = './ean_codes.csv'
+    store_path = store_path_for(ean_csv_path)
     product_db_path = './FICHIER GENERAL.xlsx'
     pdf_directory = './A Fiches techniques a traiter'
     pdf_directory_traiter = './B Fiches techniques traitees'
-
-    # Column indices (0-based)
-    product_name_col_index = 3  # Column 4 (D) for Product Name
-    ean_col_index = 4           # Column 5 (E) for 13-digit EAN
-    ref_fourn_col = 5           # Column 6 (F) for Ref Four
-    brand_col_index = 6         # Column 7 (G) for Brand ('AUTOBEST')
+    index_path = INDEX_PATH
 
     # --- File and Directory Checks ---
-    if not os.path.exists(ean_csv_path):
+    if not os.path.exists(ean_csv_path) and not os.path.exists(store_path):
         print(f"Error: '{ean_csv_path}' not found. Please run the EAN extraction script first.")
         return
     if not os.path.exists(product_db_path):
@@ -37,217 +164,118 @@ def rename_pdfs():
         return
     
     # Vérifier si le dossier de destination existe, sinon le créer
-    if not os.path.exists(pdf_directory_traiter):
+    if not dry_run and not os.path.exists(pdf_directory_traiter):
         os.makedirs(pdf_directory_traiter)
         print(f"Created directory '{pdf_directory_traiter}'.")
 
+    metrics_writer = metrics.MetricsWriter(metrics_path) if metrics_path else None
+    store = None
     try:
         # --- Load and Prepare Product Database ---
-        print(f"Chargement du fichier Excel '{product_db_path}'...")
-        start_excel = time.time()
-        db_df = pd.read_excel(product_db_path, header=6, dtype=str)
-        excel_time = time.time() - start_excel
-        print(f"Successfully loaded '{product_db_path}' en {excel_time:.2f} secondes.")
-        # Get column names by index to avoid issues with header names
-        start_mapping = time.time()
-        product_name_col = db_df.columns[product_name_col_index]
-        ean_col = db_df.columns[ean_col_index]
-        ref_fourn_col = db_df.columns[ref_fourn_col]
-        brand_col = db_df.columns[brand_col_index]
-
-        # --- Create Mapping for 13-digit EANs ---
-        ean_map_df = db_df.dropna(subset=[product_name_col, ean_col])
-        ean_to_name_map = pd.Series(ean_map_df[product_name_col].values, index=ean_map_df[ean_col]).to_dict()
-        print(f"Created {len(ean_to_name_map)} mappings for 13-digit EANs.")
-
-        # --- Create Mapping for 6-digit AUTOBEST codes ---
-        autobest_df = db_df[db_df[brand_col] == 'AUTOBEST'].dropna(subset=[product_name_col, ref_fourn_col])
-        autobest_to_name_map = pd.Series(autobest_df[product_name_col].values, index=autobest_df[ref_fourn_col]).to_dict()
-        print(f"Created {len(autobest_to_name_map)} mappings for 6-digit AUTOBEST codes.")
-
-        # --- Pour LMA: extraire tous les produits avec le même code de base ---
-        lma_df = db_df[db_df[brand_col] == 'LMA'].dropna(subset=[product_name_col, ref_fourn_col])
-        
-        # Mapper chaque code LMA de base à toutes ses références OUT correspondantes
-        lma_code_to_refs = {}
-        
-        # Parcourir toutes les lignes LMA
-        for _, row in lma_df.iterrows():
-            ref_fourn = str(row[ref_fourn_col])
-            product_name = row[product_name_col]
-            
-            # Extraire le code de base (avant espace ou tiret)
-            base_code = re.split(r'[-\s]', ref_fourn)[0]
-            
-            # Vérifier que le code de base a au moins 4 chiffres
-            if base_code.isdigit() and len(base_code) >= 4:
-                if base_code not in lma_code_to_refs:
-                    lma_code_to_refs[base_code] = []
-                
-                lma_code_to_refs[base_code].append({
-                    'product_name': product_name,
-                    'ref_fourn': ref_fourn
-                })
-        
-        print(f"Created mappings for {len(lma_code_to_refs)} LMA base codes with {sum(len(refs) for refs in lma_code_to_refs.values())} total products.")
-        
-        mapping_time = time.time() - start_mapping
-        print(f"Création des mappings terminée en {mapping_time:.2f} secondes.")
-
-        # --- Read CSV and Process Files ---
+        load_metrics = FileMetrics('rename', os.path.basename(ean_csv_path))
+        with load_metrics.stage('index_load'):
+            product_index = load_product_index(product_db_path, index_path, rebuild=rebuild_index)
+        print_index_summary(product_index)
+
+        # --- Read the extraction results and Plan all the Files ---
         start_csv = time.time()
-        pdf_ean_df = pd.read_csv(ean_csv_path, sep=';', dtype=str)
+        with load_metrics.stage('results_load'):
+            store = ResultsStore(store_path)
+            # Corrections manuelles du CSV reportées dans la base
+            store.sync_from_csv(ean_csv_path)
+            entries = list(store.files())
         csv_time = time.time() - start_csv
-        print(f"\nCSV chargé en {csv_time:.2f} secondes. Processing {len(pdf_ean_df)} files from '{ean_csv_path}'.\n")
+        print(f"\nRésultats chargés en {csv_time:.2f} secondes. Processing {len(entries)} files from '{store_path}'.\n")
 
-        for index, row in pdf_ean_df.iterrows():
-            try:
-                original_filename = row['Filename']
-                codes_str = row.get('EAN Codes', '')
-                fournisseur = row.get('Fournisseur', '')
+        # Une seule lecture des dossiers A et B
+        available = set(os.listdir(pdf_directory))
+        to_plan = []
+        for original_filename, fournisseur, codes in entries:
+            if not codes:
+                print(f"Skipping '{original_filename}': No codes found.")
+            elif original_filename not in available:
+                print(f"Skipping '{original_filename}': file not found.")
+            else:
+                to_plan.append((original_filename, fournisseur, codes))
+        destinations = DestinationRegistry(pdf_directory_traiter)
+        with load_metrics.stage('lookup'):
+            plan = build_rename_plan(to_plan, product_index, destinations)
+        if metrics_writer is not None:
+            metrics_writer.write(load_metrics)
+        print(f"\nPlan: {plan.summary()}.")
 
-                if not codes_str or pd.isna(codes_str):
-                    print(f"Skipping '{original_filename}': No codes found.")
-                    continue
+        if dry_run:
+            print("\nDry run, aucun fichier créé:")
+            for original_filename, code, product_name, new_path in plan.rows:
+                print(f"  {original_filename} -> {os.path.basename(new_path)} (code {code}, produit '{product_name}')")
+            return
 
-                # Process all codes in the file
-                codes = [code.strip() for code in codes_str.split(';') if code.strip()]
-                matches_found = False
+        # Après avoir planifié tous les fichiers, créer les fichiers prévus: liens/copies
+        # puis renommage de l'original vers le dernier (l'original disparaît)
+        file_stats = FileOpStats()
+        for index, (original_filename, _, codes) in enumerate(to_plan):
+            try:
                 original_path = os.path.join(pdf_directory, original_filename)
-                
-                # Skip if original file doesn't exist
-                if not os.path.exists(original_path):
-                    print(f"Skipping '{original_filename}': file not found.")
-                    continue
-                    
-                # Process each code
-                current_source_path = original_path  # Garde une trace du chemin source actuel
-                first_renamed_file = None  # Pour stocker le premier fichier renommé
-                successfully_renamed = False  # Flag pour vérifier si au moins un fichier a été renommé
-                
-                # Initialiser le compteur de codes trouvés
-                nb_codes_trouves = 0
-                created_files = []  # Liste pour stocker les chemins des fichiers créés
-                
-                # S'assurer que le fichier original existe toujours
-                if not os.path.exists(original_path):
-                    print(f"Warning: Original file '{original_filename}' no longer exists. Skipping.")
-                    continue
-                    
-                for code_index, code in enumerate(codes):
-                    try:
-                        new_name_base = None
-                        
-                        # Determine which mapping to use based on fournisseur
-                        if fournisseur == "AUTOBEST":
-                            new_name_base = autobest_to_name_map.get(code)
-                            lookup_type = "6-digit AUTOBEST code"
-                            
-                            if new_name_base:
-                                sanitized_name = sanitize_filename(str(new_name_base))
-                                _, extension = os.path.splitext(original_filename)
-                                new_filename = f"{sanitized_name}{extension}"
-                                
-                                new_path = os.path.join(pdf_directory_traiter, new_filename)
-                                
-                                # Handle duplicate filenames by adding a counter if needed
-                                counter = 1
-                                base_path = new_path
-                                while os.path.exists(new_path):
-                                    name_parts = os.path.splitext(base_path)
-                                    new_path = f"{name_parts[0]}_{counter}{name_parts[1]}"
-                                    counter += 1
-                                
-                                # Copier le fichier original vers la nouvelle destination
-                                shutil.copy2(original_path, new_path)
-                                print(f"Created file for code '{code}' as '{os.path.basename(new_path)}'")
-                                created_files.append(new_path)
-                                nb_codes_trouves += 1
-                            else:
-                                print(f"Code '{code}' from '{original_filename}': {lookup_type} not found in database.")
-                            
-                        elif fournisseur == "LMA":
-                            # Pour LMA, rechercher toutes les références avec ce code de base
-                            lookup_type = "LMA base code"
-                            matching_refs = lma_code_to_refs.get(code, [])
-                            
-                            if matching_refs:
-                                print(f"Found {len(matching_refs)} products for LMA base code {code}")
-                                
-                                # Pour chaque référence trouvée, créer un fichier
-                                for i, ref_data in enumerate(matching_refs):
-                                    _, extension = os.path.splitext(original_filename)
-                                    new_filename = f"{ref_data['product_name']}{extension}"
-                                    
-                                    new_path = os.path.join(pdf_directory_traiter, new_filename)
-                                    
-                                    # Handle duplicate filenames if needed
-                                    counter = 1
-                                    base_path = new_path
-                                    while os.path.exists(new_path):
-                                        name_parts = os.path.splitext(base_path)
-                                        new_path = f"{name_parts[0]}_{counter}{name_parts[1]}"
-                                        counter += 1
-                                    
-                                    # Copier le fichier original vers la nouvelle destination
-                                    shutil.copy2(original_path, new_path)
-                                    print(f"Created file for LMA product '{ref_data['product_name']}' as '{os.path.basename(new_path)}'")
-                                    created_files.append(new_path)
-                                    nb_codes_trouves += 1
-                            else:
-                                print(f"Code '{code}' from '{original_filename}': {lookup_type} not found in database.")
-                        
-                        else:
-                            # Méthode standard pour les codes EAN
-                            new_name_base = ean_to_name_map.get(code)
-                            lookup_type = "13-digit EAN"
-                            
-                            if new_name_base:
-                                sanitized_name = sanitize_filename(str(new_name_base))
-                                _, extension = os.path.splitext(original_filename)
-                                new_filename = f"{sanitized_name}{extension}"
-                                
-                                new_path = os.path.join(pdf_directory_traiter, new_filename)
-                                
-                                # Handle duplicate filenames by adding a counter if needed
-                                counter = 1
-                                base_path = new_path
-                                while os.path.exists(new_path):
-                                    name_parts = os.path.splitext(base_path)
-                                    new_path = f"{name_parts[0]}_{counter}{name_parts[1]}"
-                                    counter += 1
-                                
-                                # Copier le fichier original vers la nouvelle destination
-                                shutil.copy2(original_path, new_path)
-                                print(f"Created file for code '{code}' as '{os.path.basename(new_path)}'")
-                                created_files.append(new_path)
-                                nb_codes_trouves += 1
-                            else:
-                                print(f"Code '{code}' from '{original_filename}': {lookup_type} not found in database.")
-                    except Exception as e:
-                        print(f"Error processing code '{code}' from '{original_filename}': {e}")
-                        continue  # Continue with next code
-                
-                # Après avoir traité tous les codes, supprimer l'original si au moins un fichier a été créé
+                created_files = plan.destinations.get(original_filename, [])
+                nb_codes_trouves = len(created_files)
+                file_metrics = FileMetrics('rename', original_filename)
+                file_metrics.count('codes', len(codes))
                 if nb_codes_trouves > 0:
-                    # Supprimer le fichier original car au moins une copie a été créée
-                    os.remove(original_path)
-                    print(f"Fichier original '{original_filename}' supprimé après création de {nb_codes_trouves} fichier(s).")
+                    bytes_before = file_stats.bytes_written
+                    with file_metrics.stage('copy'):
+                        created = execute_plan(original_path, created_files, copy_mode, file_stats)
+                    file_metrics.count('files_created', len(created))
+                    file_metrics.count('bytes_written', file_stats.bytes_written - bytes_before)
+                    if os.path.exists(original_path):
+                        print(f"Warning: original file '{original_filename}' kept, "
+                              f"{len(created)}/{nb_codes_trouves} file(s) created.")
+                    else:
+                        print(f"Fichier original '{original_filename}' supprimé après création de {len(created)} fichier(s).")
                 else:
                     print(f"No valid codes found for '{original_filename}'. File not renamed.")
-                
+                if metrics_writer is not None:
+                    metrics_writer.write(file_metrics)
+
             except Exception as e:
                 print(f"Error processing file entry {index}: {e}")
                 continue  # Continue with next file
 
+        print(f"\nOpérations fichiers: {file_stats.summary()}.")
+
     except FileNotFoundError as e:
         print(f"Error: {e}")
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        if store is not None:
+            store.close()
+        if metrics_writer is not None:
+            metrics_writer.close()
+            print(metrics_writer.summary())
 
-if __name__ == "__main__":
-    rename_pdfs()
+DESCRIPTION = "Rename the PDFs of folder A from the extraction results and FICHIER GENERAL.xlsx."
+
+def add_arguments(parser):
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="recompile the product index even if the Excel file did not change")
+    parser.add_argument("--copy-mode", choices=COPY_MODES, default="auto",
+                        help="how extra files are created from one PDF: reflink, hard link or plain copy "
+                             "(auto: reflink, then copy)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only print the planned files and the codes not found, do not touch folders A and B")
+    metrics.add_arguments(parser)
+
+def run(args):
+    start_total = time.time()
+    with metrics.profiled(args.profile):
+        rename_pdfs(rebuild_index=args.rebuild_index, copy_mode=args.copy_mode, metrics_path=args.metrics,
+                    dry_run=args.dry_run)
     total_time = time.time() - start_total
     print(f"\nRenaming process complete en {total_time:.2f} secondes.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
@@ -0,0 +1,187 @@
+import os
+import csv
+import time
+import sqlite3
+
+from ean_validation import invalid_ean13_per_row
+
+STORE_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filename    TEXT PRIMARY KEY,
+    fournisseur TEXT NOT NULL DEFAULT '',
+    source      TEXT NOT NULL,          -- 'extract' ou 'csv' (corrections manuelles)
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS codes (
+    filename    TEXT NOT NULL REFERENCES files(filename) ON DELETE CASCADE,
+    position    INTEGER NOT NULL,       -- ordre du code dans le fichier
+    code        TEXT NOT NULL,
+    fournisseur TEXT NOT NULL DEFAULT '',
+    page        INTEGER,                -- page (1-based) où le code a été trouvé, NULL si inconnue
+    PRIMARY KEY (filename, position)
+);
+CREATE INDEX IF NOT EXISTS codes_by_code ON codes (code, fournisseur);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def store_path_for(csv_path):
+    """The store lives next to the CSV it is exported to: ean_codes.csv -> ean_codes.sqlite."""
+    return os.path.splitext(csv_path)[0] + '.sqlite'
+
+
+def write_ean_csv(output_csv_path, filenames, results, ean_check='reject'):
+    """Writes ean_codes.csv in filenames order from results {filename: (codes, fournisseur)}."""
+    # Validation de toute la colonne en un seul appel (les codes fournisseurs ne sont pas des EAN)
+    if ean_check == 'flag':
+        invalid_codes = invalid_ean13_per_row(
+            [] if results[filename][1] else results[filename][0] for filename in filenames)
+    else:
+        invalid_codes = [[] for _ in filenames]
+
+    with open(output_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.writer(csvfile, delimiter=';')
+        csv_writer.writerow(['Filename', 'EAN Codes', 'Fournisseur', 'Invalid EAN Codes'])
+        for filename, invalid in zip(filenames, invalid_codes):
+            ean_codes, fournisseur = results[filename]
+            csv_writer.writerow([filename, ';'.join(ean_codes), fournisseur, ';'.join(invalid)])
+
+
+class ResultsStore:
+    """SQLite store of the extraction results: one row per file in `files`,
+    one row per (file, code, fournisseur, page) in `codes`, indexed by code.
+
+    ean_codes.csv stays the file edited by hand: export_csv() writes it from
+    the store, and sync_from_csv() imports it back when it was modified after
+    the last export or import."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA foreign_keys = ON")
+        # Journal par défaut (pas de WAL): le dossier peut être sur un partage réseau, et un
+        # store créé en WAL par une version précédente y est ramené
+        self._db.execute("PRAGMA journal_mode = DELETE")
+        with self._db:
+            self._db.executescript(_SCHEMA)
+            self._db.execute("INSERT OR IGNORE INTO meta VALUES ('schema_version', ?)", (str(STORE_SCHEMA_VERSION),))
+
+    def put_results(self, results, pages=None, source='extract'):
+        """Inserts or replaces the results {filename: (codes, fournisseur)} in
+        one transaction. pages is an optional {filename: {code: page}}."""
+        pages = pages or {}
+        now = time.time()
+        file_rows = []
+        code_rows = []
+        for filename, (codes, fournisseur) in results.items():
+            fournisseur = fournisseur or ''
+            file_rows.append((filename, fournisseur, source, now))
+            code_pages = pages.get(filename) or {}
+            code_rows += [(filename, position, code, fournisseur, code_pages.get(code))
+                          for position, code in enumerate(codes)]
+        with self._db:
+            self._db.executemany("DELETE FROM codes WHERE filename = ?", [(row[0],) for row in file_rows])
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", file_rows)
+            self._db.executemany("INSERT INTO codes VALUES (?, ?, ?, ?, ?)", code_rows)
+
+    def retain(self, filenames):
+        """Removes the files (and their codes) not in filenames. Returns the number removed."""
+        keep = set(filenames)
+        removed = [(name,) for (name,) in self._db.execute("SELECT filename FROM files") if name not in keep]
+        with self._db:
+            self._db.executemany("DELETE FROM files WHERE filename = ?", removed)
+        return len(removed)
+
+    def files(self):
+        """Yields (filename, fournisseur, [codes]) for every file, in filename order."""
+        rows = self._db.execute(
+            "SELECT f.filename, f.fournisseur, c.code FROM files f LEFT JOIN codes c ON c.filename = f.filename "
+            "ORDER BY f.filename, c.position")
+        current = None
+        for filename, fournisseur, code in rows:
+            if current is None or current[0] != filename:
+                if current is not None:
+                    yield current
+                current = (filename, fournisseur, [])
+            if code is not None:
+                current[2].append(code)
+        if current is not None:
+            yield current
+
+    def results(self):
+        """Returns {filename: (codes, fournisseur)}."""
+        return {filename: (codes, fournisseur) for filename, fournisseur, codes in self.files()}
+
+    def codes_for(self, filename):
+        """Returns the (code, fournisseur, page) rows of one file, in order."""
+        return self._db.execute("SELECT code, fournisseur, page FROM codes WHERE filename = ? ORDER BY position",
+                                (filename,)).fetchall()
+
+    def files_with_code(self, code):
+        """Returns the (filename, fournisseur, page) rows where code was found (indexed lookup)."""
+        return self._db.execute("SELECT filename, fournisseur, page FROM codes WHERE code = ? ORDER BY filename",
+                                (code,)).fetchall()
+
+    def summary(self):
+        file_count, = self._db.execute("SELECT COUNT(*) FROM files").fetchone()
+        by_supplier = self._db.execute(
+            "SELECT fournisseur, COUNT(*) FROM codes GROUP BY fournisseur ORDER BY fournisseur").fetchall()
+        codes = ", ".join(f"{fournisseur or 'EAN'} {count}" for fournisseur, count in by_supplier) or "aucun code"
+        return f"{file_count} fichier(s), {codes}"
+
+    def _get_meta(self, key):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def export_csv(self, csv_path, ean_check='reject'):
+        """Writes csv_path (ean_codes.csv format) from the store and remembers its mtime."""
+        results = self.results()
+        write_ean_csv(csv_path, sorted(results), results, ean_check)
+        self._set_meta('csv_mtime_ns', os.stat(csv_path).st_mtime_ns)
+
+    def import_csv(self, csv_path):
+        """Replaces the store content by the rows of csv_path (ean_codes.csv
+        format, possibly edited by hand). Pages of codes already known are kept."""
+        known_pages = {(filename, code): page for filename, code, page in
+                       self._db.execute("SELECT filename, code, page FROM codes")}
+        results = {}
+        pages = {}
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f, delimiter=';'):
+                filename = (row.get('Filename') or '').strip()
+                if not filename:
+                    continue
+                codes = [code.strip() for code in (row.get('EAN Codes') or '').split(';') if code.strip()]
+                results[filename] = (codes, (row.get('Fournisseur') or '').strip())
+                pages[filename] = {code: known_pages.get((filename, code)) for code in codes}
+        with self._db:
+            self._db.execute("DELETE FROM files")
+        self.put_results(results, pages, source='csv')
+        self._set_meta('csv_mtime_ns', os.stat(csv_path).st_mtime_ns)
+        return len(results)
+
+    def sync_from_csv(self, csv_path):
+        """Imports csv_path if it changed since the last export or import
+        (manual corrections). Returns True if it was imported."""
+        if not os.path.exists(csv_path):
+            return False
+        last = self._get_meta('csv_mtime_ns')
+        if last is not None and int(last) == os.stat(csv_path).st_mtime_ns:
+            return False
+        count = self.import_csv(csv_path)
+        reason = "importé" if last is None else "modifié depuis la dernière extraction"
+        print(f"'{csv_path}' {reason}: {count} ligne(s) importée(s) dans '{self.path}'.")
+        return True
+
+    def close(self):
+        self._db.close()
@@ -1,6 +1,8 @@
 import os
 import sys
-import PyPDF2
+import json
+import time
+import argparse
 from pathlib import Path
 
 def view_pdf_structure(pdf_path):
@@ -12,6 +14,7 @@ def view_pdf_structure(pdf_path):
         return
     
     try:
+        import PyPDF2
         # Ouvrir le fichier PDF
         with open(pdf_path, 'rb') as file:
             # Créer un lecteur PDF
@@ -69,23 +72,134 @@ def view_pdf_structure(pdf_path):
         import traceback
         traceback.print_exc()
 
-def main():
+def scan_pdf_structure(pdf_path):
+    """Returns a compact summary of a PDF read with PyMuPDF: page sizes, text
+    length, EAN candidates and supplier markers (same rules as
+    extract_ean.py) and image counts. Errors are reported in 'error'."""
+    import fitz  # PyMuPDF
+    from extract_ean import SUPPLIER_RULES, SupplierScan
+
+    summary = {'file': os.path.basename(pdf_path), 'bytes': os.path.getsize(pdf_path)}
+    try:
+        doc = fitz.open(pdf_path)
+        supplier_scan = SupplierScan()
+        page_sizes = []
+        text_length = 0
+        image_xrefs = set()
+        image_refs = 0
+        for page in doc:
+            page_sizes.append([round(page.rect.width, 1), round(page.rect.height, 1)])
+            text = page.get_text()
+            text_length += len(text)
+            supplier_scan.feed(text)
+            images = page.get_images(full=True)
+            image_refs += len(images)
+            image_xrefs.update(img[0] for img in images)
+        doc.close()
+    except Exception as e:
+        summary['error'] = str(e)
+        return summary
+
+    summary.update(
+        pages=len(page_sizes),
+        # Une seule taille si toutes les pages sont identiques
+        page_sizes=page_sizes[:1] if all(size == page_sizes[0] for size in page_sizes) else page_sizes,
+        text_length=text_length,
+        ean_candidates=len(supplier_scan.ean_codes),
+        valid_eans=len(supplier_scan.valid_ean_codes()),
+        supplier_markers=sorted(SUPPLIER_RULES[i]['fournisseur'] for i in supplier_scan.markers),
+        supplier_codes={SUPPLIER_RULES[i]['fournisseur']: code for i, code in supplier_scan.codes.items()},
+        image_xrefs=len(image_xrefs),
+        image_refs=image_refs,
+    )
+    return summary
+
+def scan_folder(directory, workers=None, output=None):
+    """Writes one JSON line per PDF of directory (sorted by name) to output
+    (stdout by default), the PDFs being read by a pool of `workers`
+    processes. The summary goes to stderr. Returns the list of summaries."""
+    workers = workers or os.cpu_count() or 1
+    output = output or sys.stdout
+    paths = [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+             if name.lower().endswith('.pdf')]
+    start = time.time()
+    executor = None
+    if workers > 1 and len(paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        executor = ProcessPoolExecutor(max_workers=workers)
+    summaries = []
+    try:
+        if executor is not None:
+            results = executor.map(scan_pdf_structure, paths, chunksize=max(1, len(paths) // (workers * 4)))
+        else:
+            results = map(scan_pdf_structure, paths)
+        for summary in results:
+            output.write(json.dumps(summary, ensure_ascii=False, separators=(',', ':')) + '\n')
+            summaries.append(summary)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    output.flush()
+
+    elapsed = max(time.time() - start, 1e-9)
+    errors = sum(1 for summary in summaries if 'error' in summary)
+    with_eans = sum(1 for summary in summaries if summary.get('valid_eans'))
+    markers = {}
+    for summary in summaries:
+        for fournisseur in summary.get('supplier_markers', []):
+            markers[fournisseur] = markers.get(fournisseur, 0) + 1
+    marker_text = ", ".join(f"{name} {count}" for name, count in sorted(markers.items())) or "aucun"
+    print(f"{len(summaries)} PDF inspectés en {elapsed:.2f} secondes ({len(summaries) / elapsed:.1f} PDF/s, "
+          f"{workers} processus): {with_eans} avec EAN valides, marqueurs fournisseurs: {marker_text}, "
+          f"{sum(summary.get('pages', 0) for summary in summaries)} pages, "
+          f"{sum(summary.get('image_xrefs', 0) for summary in summaries)} images, {errors} erreur(s).",
+          file=sys.stderr)
+    return summaries
+
+DESCRIPTION = ("Show the structure of a PDF, or with a folder, write one compact JSON line per PDF "
+               "(page sizes, text length, EAN candidates, supplier markers, images).")
+
+def add_arguments(parser):
+    parser.add_argument("path", nargs="?", help="PDF file, or folder for the batch mode")
+    parser.add_argument("--json", action="store_true", help="compact JSON summary for a single PDF (PyMuPDF)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="batch mode: processes reading the PDFs (default: number of CPUs)")
+    parser.add_argument("--output", metavar="PATH", default=None,
+                        help="batch mode: write the JSON lines to PATH instead of the standard output")
+
+def run(args):
+    pdf_path = args.path
     # Vérifier si un chemin de fichier a été fourni
-    if len(sys.argv) < 2:
-        print("Usage: python view_pdf_structure.py <chemin_du_pdf>")
+    if not pdf_path:
+        print("Usage: python view_pdf_structure.py <chemin_du_pdf | dossier>")
         print("\nOu entrez le chemin du fichier PDF manuellement:")
         pdf_path = input("Chemin du fichier PDF: ").strip()
         if not pdf_path:
             print("Aucun fichier spécifié. Fin du programme.")
             return
-    else:
-        pdf_path = sys.argv[1]
     
     # Convertir en chemin absolu si nécessaire
     pdf_path = os.path.abspath(pdf_path)
-    
-    # Afficher la structure du PDF
-    view_pdf_structure(pdf_path)
+
+    if os.path.isdir(pdf_path):
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as output:
+                scan_folder(pdf_path, args.workers, output)
+        else:
+            scan_folder(pdf_path, args.workers)
+    elif args.json:
+        if not os.path.exists(pdf_path):
+            print(f"Erreur: Le fichier '{pdf_path}' n'existe pas.")
+            return
+        print(json.dumps(scan_pdf_structure(pdf_path), ensure_ascii=False, separators=(',', ':')))
+    else:
+        # Afficher la structure du PDF
+        view_pdf_structure(pdf_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,328 @@
+import os
+import sys
+import time
+import struct
+import select
+import argparse
+
+import extract_images
+from extract_ean import EAN_CHECKS, SCAN_STRATEGIES, _analyze_pdf
+from file_ops import COPY_MODES, DestinationRegistry, FileOpStats, execute_plan
+from pipeline import IMAGE_DIRECTORY, INDEX_PATH, PDF_DIRECTORY, PROCESSED_DIRECTORY, PRODUCT_DB_PATH, STORE_PATH
+from product_index import load_product_index
+from results_store import ResultsStore
+from rename_files import plan_destinations, print_index_summary
+
+# inotify(7)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """Reports the names created, written or moved into a directory (Linux inotify through ctypes)."""
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        mask = _IN_CREATE | _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, os.strerror(errno), directory)
+
+    def wait(self, timeout):
+        """Returns the set of names with an event within timeout seconds (empty if none)."""
+        names = set()
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return names
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Same interface as InotifyWatcher, by comparing directory listings every interval."""
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = directory
+        self.interval = interval
+        self._signatures = {}
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        signatures = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                signatures[entry.name] = (st.st_size, st.st_mtime_ns)
+        changed = {name for name, signature in signatures.items() if self._signatures.get(name) != signature}
+        self._signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory, polling=False, interval=1.0):
+    """Returns an InotifyWatcher when available (Linux), a PollingWatcher otherwise."""
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print(f"inotify indisponible ({e}), surveillance par scrutation.")
+    return PollingWatcher(directory, interval)
+
+
+class WatchSession:
+    """State kept between micro-batches: the product index (reloaded only when
+    the workbook changes), the image manifest, the results store (each
+    batch is added to it, the files no longer in folder A are dropped) and
+    the optional process pool."""
+
+    def __init__(self, pdf_directory, processed_directory, image_directory, product_db_path, index_path,
+                 workers=1, copy_mode='auto', scan='full', ean_check='reject', images=True, image_policy=None,
+                 csv_path=None, store_path=STORE_PATH):
+        self.pdf_directory = pdf_directory
+        self.processed_directory = processed_directory
+        self.image_directory = image_directory
+        self.product_db_path = product_db_path
+        self.index_path = index_path
+        self.copy_mode = copy_mode
+        self.scan = scan
+        self.ean_check = ean_check
+        self.images = images
+        self.image_policy = {**extract_images.DEFAULT_IMAGE_POLICY, **(image_policy or {})}
+        self.csv_path = csv_path
+        self.store = ResultsStore(store_path)
+        self.file_stats = FileOpStats()
+        self.executor = None
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.product_index = None
+        self._workbook_signature = None
+        os.makedirs(processed_directory, exist_ok=True)
+        if images:
+            os.makedirs(image_directory, exist_ok=True)
+            self.manifest = extract_images.load_manifest(image_directory, self.image_policy)
+            self.taken = set(self.manifest['images'].values())
+        self.refresh_index()
+
+    def refresh_index(self):
+        """(Re)loads the product index if the workbook changed since the last load."""
+        st = os.stat(self.product_db_path)
+        signature = (st.st_size, st.st_mtime_ns)
+        if signature == self._workbook_signature:
+            return
+        if self.product_index is not None:
+            print(f"'{self.product_db_path}' modifié, rechargement de l'index produits.")
+            self.product_index.close()
+        self.product_index = load_product_index(self.product_db_path, self.index_path)
+        self._workbook_signature = signature
+        print_index_summary(self.product_index)
+
+    def _analyze(self, filenames):
+        paths = [os.path.join(self.pdf_directory, filename) for filename in filenames]
+        if self.executor is not None and len(paths) > 1:
+            return list(self.executor.map(_analyze_pdf, paths, [self.scan] * len(paths),
+                                          [self.ean_check] * len(paths)))
+        return [_analyze_pdf(path, self.scan, self.ean_check) for path in paths]
+
+    def process(self, filenames):
+        """Extracts, renames and extracts the images of one micro-batch of folder A files."""
+        self.refresh_index()
+        destinations = DestinationRegistry(self.processed_directory)
+        image_pdfs = []
+        analyzed = self._analyze(filenames)
+        self.store.put_results({filename: (codes, fournisseur) for filename, codes, fournisseur, _, _ in analyzed},
+                               {filename: stats['code_pages'] for filename, _, _, stats, _ in analyzed})
+        for filename, codes, fournisseur, _, _ in analyzed:
+            print(f"{filename}: {';'.join(codes) if codes else 'no codes found'}")
+            if not codes:
+                continue
+            planned = plan_destinations(filename, codes, fournisseur, self.product_index, destinations)
+            if not planned:
+                print(f"No valid codes found for '{filename}'. File not renamed.")
+                continue
+            created = execute_plan(os.path.join(self.pdf_directory, filename), planned, self.copy_mode,
+                                   self.file_stats)
+            image_pdfs += [path for path in created if os.path.basename(path).lower().startswith('r')]
+
+        if self.images and image_pdfs:
+            jobs = []
+            for pdf_path in image_pdfs:
+                extract_images.release_pdf_images(self.manifest, os.path.basename(pdf_path), self.image_directory,
+                                                  self.taken)
+                extract_images.extract_and_convert_images(pdf_path, self.image_directory, self.manifest,
+                                                          self.executor, jobs, self.image_policy, self.taken)
+            for future, image_file, description in jobs:
+                try:
+                    future.result()
+                except Exception as img_e:
+                    print(f"Could not process {description}: {img_e}")
+                    extract_images._forget_image(self.manifest, image_file)
+            for pdf_path in image_pdfs:
+                extract_images.record_pdf(self.manifest, pdf_path)
+            extract_images.write_manifest(self.manifest, self.image_directory)
+
+        # Comme extract_ean: seuls les fichiers encore dans le dossier A restent dans le store
+        self.store.retain(name for name in os.listdir(self.pdf_directory) if name.lower().endswith('.pdf'))
+        if self.csv_path:
+            # Via le store: l'horodatage exporté évite une réimportation par rename_files
+            self.store.export_csv(self.csv_path, self.ean_check)
+
+    def close(self):
+        self.store.close()
+        if self.executor is not None:
+            self.executor.shutdown()
+        if self.product_index is not None:
+            self.product_index.close()
+
+
+def watch(pdf_directory=PDF_DIRECTORY, processed_directory=PROCESSED_DIRECTORY, image_directory=IMAGE_DIRECTORY,
+          product_db_path=PRODUCT_DB_PATH, index_path=INDEX_PATH, settle=0.5, debounce=0.3, max_delay=5.0,
+          batch_size=20, polling=False, poll_interval=1.0, exit_after_idle=None, **session_options):
+    """Watches pdf_directory and processes the PDFs dropped into it.
+
+    A file is ready once its size and mtime have not changed for `settle`
+    seconds. Ready files are processed in micro-batches of at most
+    batch_size, once no new event came for `debounce` seconds (or after
+    max_delay during a continuous burst). Files already there at start are
+    processed first. Files left in the folder (no code, no product) are
+    only processed again if they change. With exit_after_idle, returns
+    after that many seconds without any pending file."""
+    session = WatchSession(pdf_directory, processed_directory, image_directory, product_db_path, index_path,
+                           **session_options)
+    watcher = open_watcher(pdf_directory, polling, poll_interval)
+    print(f"\nSurveillance de '{pdf_directory}' ({type(watcher).__name__}), Ctrl+C pour arrêter.\n")
+
+    pending = {}  # nom -> (taille, mtime_ns, dernier changement)
+    done = {}     # nom -> (taille, mtime_ns) au moment du traitement
+    now = time.monotonic()
+    changed = set(os.listdir(pdf_directory))
+    last_event = first_pending = idle_since = now
+    processed = 0
+    try:
+        while True:
+            now = time.monotonic()
+            for name in changed:
+                if not name.lower().endswith('.pdf'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(pdf_directory, name))
+                except FileNotFoundError:
+                    pending.pop(name, None)
+                    continue
+                signature = (st.st_size, st.st_mtime_ns)
+                if done.get(name) == signature:
+                    continue
+                if not pending:
+                    first_pending = now
+                pending[name] = signature + (now,)
+            if changed:
+                last_event = now
+
+            # Fichiers dont la taille et la date n'ont pas bougé depuis `settle` secondes
+            ready = []
+            for name, (size, mtime_ns, changed_at) in list(pending.items()):
+                try:
+                    st = os.stat(os.path.join(pdf_directory, name))
+                except FileNotFoundError:
+                    del pending[name]
+                    continue
+                if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                    pending[name] = (st.st_size, st.st_mtime_ns, now)
+                elif st.st_size > 0 and now - changed_at >= settle:
+                    ready.append(name)
+
+            burst_over = now - last_event >= debounce or now - first_pending >= max_delay
+            if ready and (burst_over or len(ready) >= batch_size):
+                ready.sort()
+                for i in range(0, len(ready), batch_size):
+                    batch = ready[i:i + batch_size]
+                    start = time.perf_counter()
+                    try:
+                        session.process(batch)
+                    except Exception as e:
+                        # Le démon continue: les fichiers du lot restent dans A jusqu'à leur prochaine modification
+                        print(f"Error processing batch {batch}: {e}")
+                    elapsed = time.perf_counter() - start
+                    for name in batch:
+                        signature = pending.pop(name)[:2]
+                        if os.path.exists(os.path.join(pdf_directory, name)):
+                            done[name] = signature
+                    processed += len(batch)
+                    print(f"Lot de {len(batch)} PDF traité en {elapsed * 1000:.0f} ms "
+                          f"({elapsed * 1000 / len(batch):.0f} ms/PDF), {processed} depuis le lancement.\n")
+                first_pending = idle_since = time.monotonic()
+
+            if pending:
+                idle_since = now
+            elif exit_after_idle is not None and now - idle_since >= exit_after_idle:
+                break
+            changed = watcher.wait(min(settle, debounce) / 2 if pending else poll_interval)
+    except KeyboardInterrupt:
+        print("\nArrêt demandé.")
+    finally:
+        watcher.close()
+        session.close()
+    print(f"{processed} PDF traité(s). Opérations fichiers: {session.file_stats.summary()}.")
+
+
+DESCRIPTION = "Watch folder A and extract, rename and extract images of each PDF dropped into it."
+
+
+def add_arguments(parser):
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for PDF analysis and image encoding (default: 1, in this process)")
+    parser.add_argument("--settle", type=float, default=0.5,
+                        help="seconds without size/mtime change before a file is considered written")
+    parser.add_argument("--debounce", type=float, default=0.3,
+                        help="seconds without new event before a micro-batch starts")
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--polling", action="store_true", help="scan the folder instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--copy-mode", choices=COPY_MODES, default="auto")
+    parser.add_argument("--scan", choices=SCAN_STRATEGIES, default="full")
+    parser.add_argument("--ean-check", choices=EAN_CHECKS, default="reject")
+    parser.add_argument("--no-images", action="store_true", help="do not extract the images of the R* files")
+    parser.add_argument("--csv", metavar="PATH", default=None,
+                        help="export the results store to PATH after each micro-batch (ean_codes.csv format)")
+
+
+def run(args):
+    watch(settle=args.settle, debounce=args.debounce, batch_size=args.batch_size, polling=args.polling,
+          poll_interval=args.poll_interval, workers=args.workers, copy_mode=args.copy_mode, scan=args.scan,
+          ean_check=args.ean_check, images=not args.no_images, csv_path=args.csv)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_arguments(parser)
+    run(parser.parse_args())